@@ -0,0 +1,433 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+''' Example of how to find unused switch ports from the interface counter
+    history kept by the CloudVision Analytics Engine on the CloudVision
+    Platform (CVP).
+
+    A port is reported as idle when its input and output octet counters did
+    not move by more than IDLE_OCTETS over the last WINDOW_DAYS days. Unlike a
+    check of the current bit rate, which only covers the last few seconds,
+    this finds ports that have carried no traffic for days across all the
+    switches in one pass.
+
+    Usage:
+    python cvp_idle_ports.py
+
+    Notes:
+    1) Requires numpy. The samples of each interface are kept in numpy
+       arrays and reduced to the octets moved as soon as they are collected,
+       only the totals of each port are kept.
+    2) A counter that goes down between two samples was reset (clear
+       counters, reload). The traffic for that interval is counted from zero,
+       so a reset never hides traffic and never produces a negative delta.
+    3) The period covered can be shorter than the window if the Analytics
+       Engine holds less history for a port, e.g. a switch that was added
+       recently. The Days column shows the period actually covered.
+    4) The history is requested one interface at a time. WORKERS switches
+       are collected in parallel to keep the run time down on large fabrics.
+    5) The script lacks extensive error checking when walking paths to
+       data.
+'''
+
+import Queue
+import threading
+import time
+
+import numpy as np
+import requests
+
+from cvp_client_errors import CvpApiError, CvpRequestError
+
+# ********* Customer Tunables **********
+# Address of CVP Node
+CVP_HOST = 'cvpdev'
+# Timeout for RESTful API Requests
+TIMEOUT = 60
+# Delimiter string to use between fields in output
+DELIM = ' ^ '
+# Number of days of counter history to check
+WINDOW_DAYS = 30
+# A port that moved no more than this many octets in the window is idle
+IDLE_OCTETS = 0
+# Number of switches to collect in parallel
+WORKERS = 8
+# Counters summed to measure the activity of a port
+COUNTER_FIELDS = ('inOctets', 'outOctets')
+
+# Script Variables
+AERIS = '/aeris/v1/rest'
+HEADERS = {'Accept' : 'application/json',
+           'Content-Type' : 'application/json'}
+# Query string to request the updates between two times, in nanoseconds
+HISTORY_QUERY = '?start=%d&end=%d'
+
+# CloudVision Analytics Engine Sysdb path to switch hostname
+PATH_HOSTNAME_CONFIG = 'Sysdb/sys/net/config'
+# CloudVision Analytics Engine Sysdb path to Interface Configuration.
+PATH_INTF_CONFIG = 'Sysdb/interface/config/eth/phy/slice/1/intfConfig'
+# CloudVision Analytics Engine path to the Interface Counters.
+PATH_INTF_COUNTERS = 'Smash/counters/ethIntf/FastCapi/current/counter'
+
+def is_good_response(response, prefix):
+    ''' Check for errors in a response from a GET or POST request.
+        The response argument contains a response object from a GET or POST
+        request.  The prefix argument contains the prefix to put into the
+        error message.
+
+        Raises:
+            CvpApiError: A CvpApiError is raised if there was a JSON error.
+            CvpRequestError: A CvpRequestError is raised if the request
+                is not properly constructed.
+    '''
+    if not response.ok:
+        msg = '%s: Request Error: %s' % (prefix, response.reason)
+        print msg
+        raise CvpRequestError(msg)
+
+    if 'errorCode' in response.text:
+        joutput = response.json()
+        if 'errorMessage' in joutput:
+            err_msg = joutput['errorMessage']
+        else:
+            err_msg = joutput['errorCode']
+        msg = ('%s: Request Error: %s' % (prefix, err_msg))
+        print msg
+        raise CvpApiError(msg)
+
+def get(session, url):
+    ''' Make a GET request to CloudVision Analytics Engine.
+
+        Args:
+            session (obj): A request session object.
+            url (str): URL to use for the request.
+
+        Returns:
+            The JSON response.
+
+        Raises:
+            CvpApiError: A CvpApiError is raised if there was a JSON error.
+            CvpRequestError: A CvpRequestError is raised if the request
+                is not properly constructed.
+    '''
+    # Possible Exceptions from this call:
+    # ConnectionError, HTTPError, ReadTimeout, TooManyRedirects, Timeout
+    return session.get(url, headers=HEADERS, timeout=TIMEOUT)
+
+def get_switch_list(session):
+    ''' Get the list of switches that the CloudVision Analytics Engine is
+        serving data for.
+
+        Args:
+            session (obj): A request session object.
+
+        Returns:
+            The list of switch serial numbers.
+
+        Raises:
+            CvpApiError: A CvpApiError is raised if there was a JSON error.
+            CvpRequestError: A CvpRequestError is raised if the request
+                is not properly constructed.
+    '''
+    url = 'http://%s%s' % (CVP_HOST, AERIS)
+
+    response = get(session, url)
+    is_good_response(response, 'GET')
+
+    # response.json() contains the dict of the response. The keys
+    # to the dict are the names of the switches.
+    return response.json().keys()
+
+def get_switch_hostname(session, switch):
+    ''' Get the host name for a switch given the device id (serial number).
+
+        Args:
+            session (obj): A request session object.
+            switch (str): The device id (serial number) of the switch.
+
+        Returns:
+            The host name string for the switch.
+
+        Raises:
+            CvpApiError: A CvpApiError is raised if there was a JSON error.
+            CvpRequestError: A CvpRequestError is raised if the request
+                is not properly constructed.
+    '''
+    url = 'http://%s%s/%s/%s' % (CVP_HOST, AERIS, switch, PATH_HOSTNAME_CONFIG)
+
+    response = get(session, url)
+    is_good_response(response, 'GET')
+
+    try:
+        hostname = response.json()['startState']['updates']['hostname']['_value']
+    except KeyError:
+        hostname = 'UNKNOWN'
+    return hostname
+
+def get_interface_list(session, switch):
+    ''' Get the list of interfaces for the give switch name.
+
+        Args:
+            session (obj): A request session object.
+            switch (str): The device id (serial number) of the switch.
+
+        Returns:
+            The list of interface names.
+
+        Raises:
+            CvpApiError: A CvpApiError is raised if there was a JSON error.
+            CvpRequestError: A CvpRequestError is raised if the request
+                is not properly constructed.
+    '''
+    url = 'http://%s%s/%s/%s' % (CVP_HOST, AERIS, switch, PATH_INTF_CONFIG)
+
+    response = get(session, url)
+    is_good_response(response, 'GET')
+
+    # response.json() contains the dict of the response. The keys
+    # to the updates dict are the names of the interfaces.
+    return response.json()['startState']['updates'].keys()
+
+def get_counter_value(updates, field):
+    ''' Get a counter from the updates of an interface counters entry.
+
+        Args:
+            updates (dict): The updates dict of a counters entry.
+            field (str): The name of the counter.
+
+        Returns:
+            The counter value, or None if the update does not contain it.
+    '''
+    if field in updates:
+        return updates[field]['_value']
+    # Depending on the EOS release the counters are grouped in a
+    # statistics attribute.
+    if 'statistics' in updates:
+        return updates['statistics']['_value'].get(field)
+    return None
+
+def get_interface_counter_history(session, switch, interface, start, end):
+    ''' Get the counter samples of an interface between two times.
+
+        Args:
+            session (obj): A request session object.
+            switch (str): The device id (serial number) of the switch.
+            interface (str): The name of the interface.
+            start (int): Start of the window in nanoseconds since the epoch.
+            end (int): End of the window in nanoseconds since the epoch.
+
+        Returns:
+            A tuple of two arrays, the timestamp of each sample and its
+            value, the sum of the COUNTER_FIELDS at that time. The first
+            sample is the state at the start of the window. The arrays are
+            empty if the Analytics Engine has no counters for the interface.
+
+        Raises:
+            CvpApiError: A CvpApiError is raised if there was a JSON error.
+            CvpRequestError: A CvpRequestError is raised if the request
+                is not properly constructed.
+    '''
+    url = ('http://%s%s/%s/%s/%s' %
+           (CVP_HOST, AERIS, switch, PATH_INTF_COUNTERS, interface) +
+           HISTORY_QUERY % (start, end))
+
+    response = get(session, url)
+    is_good_response(response, 'GET')
+
+    # response.json() contains the state at the start of the window followed
+    # by the notifications received in the window, oldest first. A
+    # notification only carries the counters that changed, so keep the last
+    # value of each counter.
+    data = response.json()
+    current = {}
+    entries = [data.get('startState', {})] + data.get('notifications', [])
+    # At most one sample per entry, fill preallocated arrays rather than
+    # building lists of Python ints.
+    timestamps = np.empty(len(entries), dtype=np.int64)
+    values = np.empty(len(entries), dtype=np.uint64)
+    count = 0
+    for entry in entries:
+        updates = entry.get('updates', {})
+        for field in COUNTER_FIELDS:
+            value = get_counter_value(updates, field)
+            if value is not None:
+                current[field] = value
+        if len(current) == len(COUNTER_FIELDS):
+            timestamps[count] = max(entry.get('timestamp', start), start)
+            values[count] = sum(current.values())
+            count += 1
+    return timestamps[:count], values[:count]
+
+def get_switch_counters(switch, start, end):
+    ''' Get the hostname and counter history of all interfaces of a switch.
+
+        Args:
+            switch (str): The device id (serial number) of the switch.
+            start (int): Start of the window in nanoseconds since the epoch.
+            end (int): End of the window in nanoseconds since the epoch.
+
+        Returns:
+            A tuple of the hostname and a dict keyed by the Interface Name
+            with the tuple returned by compute_activity. Interfaces without
+            counters are left out.
+
+        Raises:
+            CvpApiError: A CvpApiError is raised if there was a JSON error.
+            CvpRequestError: A CvpRequestError is raised if the request
+                is not properly constructed.
+    '''
+    # Each worker uses its own session, requests sessions are not thread
+    # safe.
+    session = requests.Session()
+    hostname = get_switch_hostname(session, switch)
+    history = {}
+    for interface in get_interface_list(session, switch):
+        timestamps, values = get_interface_counter_history(session, switch,
+                                                           interface, start,
+                                                           end)
+        # Only the totals of each interface are kept, the samples are
+        # dropped as soon as they are reduced.
+        if len(values):
+            history[interface] = compute_activity(timestamps, values)
+    return hostname, history
+
+def collect_counters(switches, start, end):
+    ''' Collect the counter history of all switches, WORKERS switches at a
+        time.
+
+        Args:
+            switches (list): The device ids (serial numbers) of the switches.
+            start (int): Start of the window in nanoseconds since the epoch.
+            end (int): End of the window in nanoseconds since the epoch.
+
+        Returns:
+            A dict keyed by the switch serial number with the tuple returned
+            by get_switch_counters. Switches that could not be collected are
+            left out.
+    '''
+    pending = Queue.Queue()
+    for switch in switches:
+        pending.put(switch)
+    results = {}
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            try:
+                switch = pending.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                result = get_switch_counters(switch, start, end)
+            except (CvpApiError, CvpRequestError,
+                    requests.exceptions.RequestException) as err:
+                print 'Skipping switch %s: %s' % (switch, err)
+                continue
+            with lock:
+                results[switch] = result
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(min(WORKERS, len(switches)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def compute_activity(timestamps, values):
+    ''' Compute the octets moved by a port from its counter samples.
+
+        Args:
+            timestamps (array): The timestamp of each sample.
+            values (array): The unsigned 64 bit counter value of each sample.
+
+        Returns:
+            A tuple of the octets moved in the window, the timestamp of the
+            first sample and the number of samples.
+    '''
+    # Order the samples by time, the deltas between neighbouring samples are
+    # the traffic of each interval.
+    order = np.argsort(timestamps, kind='mergesort')
+    values = values[order]
+
+    # The octet counters are 64 bit, keep the arithmetic in integers since a
+    # float64 cannot tell apart two large counter values a few octets apart.
+    reset = values[1:] < values[:-1]
+    # A counter going down was reset, the traffic of the interval is the
+    # count since the reset.
+    deltas = np.where(reset, values[1:], values[1:] - values[:-1])
+    activity = int(deltas.sum(dtype=np.uint64))
+    return activity, int(timestamps[order[0]]), len(values)
+
+def main():
+    ''' Collect the interface counter history and print the idle ports.
+    '''
+    session = requests.Session()
+    end = int(time.time() * 1e9)
+    start = end - int(WINDOW_DAYS * 86400 * 1e9)
+
+    # Get a list of switches by serial number (CVP device ID)
+    switches_by_sn = get_switch_list(session)
+    collected = collect_counters(switches_by_sn, start, end)
+
+    # One entry per port, in switch then interface order.
+    ports = []
+    for sw_sn in switches_by_sn:
+        if sw_sn not in collected:
+            continue
+        hostname, history = collected[sw_sn]
+        for interface in sorted(history):
+            ports.append((hostname, interface) + history[interface])
+
+    if not ports:
+        print 'No interface counters found'
+        return
+
+    activity = np.array([port[2] for port in ports], dtype=np.uint64)
+
+    # Print out the heading
+    print ' Switch Name      Port          Days    Samples  Octets'
+    print '--------------------------------------------------------'
+    idle = np.flatnonzero(activity <= IDLE_OCTETS)
+    for index in idle:
+        hostname, interface, octets, first, nsamples = ports[index]
+        # The last sample holds until the end of the window
+        days = '%.1f' % ((end - first) / (86400 * 1e9))
+        print DELIM.join((hostname, interface, days, str(nsamples),
+                          '%d' % octets))
+    print
+    print '%d of %d ports idle over the last %s days' % (len(idle), len(ports),
+                                                         WINDOW_DAYS)
+
+if __name__ == '__main__':
+    main()
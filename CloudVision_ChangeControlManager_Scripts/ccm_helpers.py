@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2019, Arista Networks
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+CCM Helpers - Shared SSH connections for CCM scripts
+Description - Connection pool and parallel helpers used by device_ping and page_check
+
+Notes -
+   Copy this file to /cvp/pythonlab/Lib/cvplibrary on the CVP servers, the scripts import it
+   with "from cvplibrary import ccm_helpers". When testing from this directory it is imported
+   from here instead.
+
+   getPool returns one pool per set of credentials for the whole interpreter, so script actions
+   which run in the same interpreter share their SSH connections and a host is only connected to
+   once. Script actions which CVP runs in separate processes cannot share connections, each of
+   them connects once per host. Connections unused for idle_timeout seconds are closed, and a pool
+   left without connections is dropped along with its password.
+
+SSHPool
+   exec_command(host, command, timeout, stop) - run a command on host over the shared connection,
+                                 returns the stdout and stderr lines. The command, connecting included,
+                                 may take at most timeout seconds, its channel is closed and socket.timeout
+                                 raised after that. Once stop is set the channel is closed and
+                                 CommandCancelled raised
+   reap() - close the connections unused for idle_timeout seconds, runs in the background
+   close() - close all connections of the pool
+
+Parallel helpers
+   runParallel(func, items, workers, stop) - run func(item) for every item in up to workers threads
+   waitFor(threads, deadline, stop) - wait for the threads, at most until deadline or stop is set,
+                                      then give their cancelled commands time to wind down
+   Quorum(total, failCount) - pass or fail a set of tests as soon as the outcome is certain
+
+"""
+import atexit
+import hashlib
+import socket
+import threading
+import time
+import Queue
+
+import paramiko
+
+# Seconds between checks of a running command's timeout
+POLL_INTERVAL = 0.1
+# Bytes read from a channel at a time
+READ_SIZE = 32768
+# Seconds waitFor gives threads to finish after their commands were cancelled, a cancelled command
+# returns within POLL_INTERVAL so this bounds how far a deadline can be overrun
+CANCEL_GRACE = 1
+# Seconds a connection may stay unused before it is closed
+IDLE_TIMEOUT = 300
+
+
+class CommandCancelled(Exception):
+    """ Raised by exec_command when the command was cancelled through stop
+    """
+
+
+class SSHPool(object):
+    """ Keep one SSH connection per host, connections are opened on first
+      use, kept alive and reopened if they dropped
+    """
+    def __init__(self, username, password=None, key_filename=None, port=22, keepalive=30,
+                 connect_timeout=10, max_sessions=8, max_connections=16, idle_timeout=IDLE_TIMEOUT):
+        self.username = username
+        self.password = password
+        self.key_filename = key_filename
+        self.port = port
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.hostlocks = {}
+        self.sessions = {}
+        # Time each host was last used and its number of running commands, busy hosts are never reaped
+        self.lastused = {}
+        self.busy = {}
+        self.reaper = None
+        # Limits the number of connections being opened at the same time
+        self.connecting = threading.BoundedSemaphore(max_connections)
+
+    def _hostlock(self, host):
+        with self.lock:
+            if host not in self.hostlocks:
+                self.hostlocks[host] = threading.Lock()
+                # sshd allows MaxSessions channels per connection, 10 by default
+                self.sessions[host] = threading.BoundedSemaphore(self.max_sessions)
+            return self.hostlocks[host]
+
+    def _connect(self, host, timeout=None):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        with self.connecting:
+            # The attempt is limited by the time left to the caller as well as connect_timeout
+            limit = self.connect_timeout
+            if timeout is not None:
+                if timeout <= 0:
+                    raise socket.timeout('%s: no time left to connect' %host)
+                limit = min(limit, timeout)
+            # Key based authentication if a key is given or no password, using the ssh agent and ~/.ssh keys
+            client.connect(host, port=self.port, username=self.username, password=self.password,
+                           key_filename=self.key_filename, timeout=limit, banner_timeout=limit,
+                           allow_agent=self.password is None, look_for_keys=self.password is None)
+        client.get_transport().set_keepalive(self.keepalive)
+        return client
+
+    def client(self, host, timeout=None):
+        """ Return the connection to host, connecting if there is no open one.
+          Connecting may take at most timeout seconds, None for connect_timeout
+        """
+        with self._hostlock(host):
+            with self.lock:
+                client = self.clients.get(host)
+                self.lastused[host] = time.time()
+            if client is None or not client.get_transport() or not client.get_transport().is_active():
+                client = self._connect(host, timeout)
+                with self.lock:
+                    self.clients[host] = client
+                    self.lastused[host] = time.time()
+                    self._startReaper()
+            return client
+
+    def _startReaper(self):
+        # Called with self.lock held
+        if self.idle_timeout is not None and self.reaper is None:
+            self.reaper = threading.Thread(target=self._reapLoop)
+            self.reaper.daemon = True
+            self.reaper.start()
+
+    def _reapLoop(self):
+        while True:
+            time.sleep(max(self.idle_timeout / 2.0, POLL_INTERVAL))
+            if not self.reap():
+                # Nothing left to watch, the next connection starts a new reaper
+                _dropPool(self)
+                return
+
+    def reap(self, now=None):
+        """ Close the connections unused for idle_timeout seconds, returns the
+          number of connections left open
+        """
+        if now is None:
+            now = time.time()
+        with self.lock:
+            for host, client in self.clients.items():
+                if self.busy.get(host) or now - self.lastused.get(host, now) < self.idle_timeout:
+                    continue
+                client.close()
+                del self.clients[host]
+            if not self.clients:
+                self.reaper = None
+            return len(self.clients)
+
+    def exec_command(self, host, command, timeout=None, stop=None):
+        """ Run command on host, returns the lists of stdout and stderr lines.
+          The command, including connecting to host, may take at most timeout
+          seconds, None for no limit, after that its channel is closed and
+          socket.timeout is raised. If stop is set
+          before the command completed its channel is closed and CommandCancelled
+          is raised
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self.lock:
+            self.busy[host] = self.busy.get(host, 0) + 1
+        try:
+            return self._exec_command(host, command, deadline, stop)
+        finally:
+            with self.lock:
+                self.busy[host] -= 1
+                self.lastused[host] = time.time()
+
+    def _exec_command(self, host, command, deadline, stop):
+        if stop is not None and stop.is_set():
+            raise CommandCancelled(command)
+        client = self.client(host, deadline - time.time() if deadline is not None else None)
+        with self.sessions[host]:
+            if stop is not None and stop.is_set():
+                raise CommandCancelled(command)
+            channel = client.get_transport().open_session()
+            try:
+                channel.settimeout(POLL_INTERVAL)
+                channel.exec_command(command)
+                stdout = []
+                stderr = []
+                while True:
+                    if stop is not None and stop.is_set():
+                        raise CommandCancelled(command)
+                    if deadline is not None and time.time() >= deadline:
+                        raise socket.timeout('%s: command timed out' %host)
+                    while channel.recv_stderr_ready():
+                        stderr.append(channel.recv_stderr(READ_SIZE))
+                    try:
+                        data = channel.recv(READ_SIZE)
+                    except socket.timeout:
+                        continue
+                    if not data:
+                        break
+                    stdout.append(data)
+                while channel.recv_stderr_ready():
+                    stderr.append(channel.recv_stderr(READ_SIZE))
+            finally:
+                channel.close()
+        return ''.join(stdout).splitlines(True), ''.join(stderr).splitlines(True)
+
+    def close(self):
+        with self.lock:
+            for client in self.clients.values():
+                client.close()
+            self.clients = {}
+
+
+_pools = {}
+_poolsLock = threading.Lock()
+
+def getPool(username, password=None, key_filename=None, port=22, **kwargs):
+    """ Return the shared pool for these credentials, creating it on first use.
+      The pools are looked up by a hash of the password, only the pool keeps it
+    """
+    secret = hashlib.sha256(password).hexdigest() if password is not None else None
+    key = (username, secret, key_filename, port)
+    with _poolsLock:
+        if key not in _pools:
+            _pools[key] = SSHPool(username, password, key_filename, port, **kwargs)
+        return _pools[key]
+
+def _dropPool(pool):
+    """ Forget a pool without connections, the next getPool creates a new one
+    """
+    with _poolsLock:
+        for key, value in _pools.items():
+            if value is pool:
+                del _pools[key]
+
+def closePools():
+    with _poolsLock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+atexit.register(closePools)
+
+
+def runParallel(func, items, workers, stop=None):
+    """ Run func(item) for every item in up to workers threads, no new items
+      are started once stop is set. Returns the threads so the caller can wait
+      for them
+    """
+    pending = Queue.Queue()
+    for item in items:
+        pending.put(item)
+    def worker():
+        while stop is None or not stop.is_set():
+            try:
+                item = pending.get_nowait()
+            except Queue.Empty:
+                return
+            func(item)
+    threads = []
+    for i in range(min(workers, len(items))):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    return threads
+
+def waitFor(threads, deadline, stop=None, grace=CANCEL_GRACE):
+    """ Wait for the threads to finish, or until deadline (a time.time() value,
+      None to wait as long as it takes), or until stop is set. The commands the
+      threads still run then are cancelled by their own timeout or stop, the
+      threads get up to grace seconds to return. Threads still running after
+      that, e.g. stuck connecting, are left behind, callers keep a copy of
+      the results they had when waitFor returned
+    """
+    for thread in threads:
+        while thread.is_alive():
+            if stop is not None and stop.is_set():
+                break
+            timeout = 0.1 if stop is not None else None
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                timeout = min(timeout, remaining) if timeout is not None else remaining
+            thread.join(timeout)
+        if thread.is_alive():
+            break
+    end = time.time() + grace
+    for thread in threads:
+        thread.join(max(end - time.time(), 0))
+
+
+class Quorum(object):
+    """ Decide the result of a set of tests while they are still running. The
+      result fails once failCount tests failed, like the scripts' final check,
+      and passes once too few tests are left to reach failCount. done is set as
+      soon as the result is known so outstanding tests can be cancelled. Set
+      decidePass to False when passing needs more than the number of failures,
+      only failing is decided early then
+    """
+    def __init__(self, total, failCount, decidePass=True):
+        self.total = total
+        self.failCount = failCount
+        self.decidePass = decidePass
+        self.passed = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.verdict = None
+        self._decide()
+
+    def _decide(self):
+        if self.verdict is not None:
+            return
+        remaining = self.total - self.passed - self.failed
+        if self.failed >= self.failCount:
+            self.verdict = False
+        elif self.decidePass and self.failed + remaining < self.failCount:
+            self.verdict = True
+        else:
+            return
+        self.done.set()
+
+    def record(self, ok):
+        """ Record the result of one test
+        """
+        with self.lock:
+            if ok:
+                self.passed += 1
+            else:
+                self.failed += 1
+            self._decide()
@@ -49,35 +49,141 @@ Audit Logging function
    alog(string) - alog function writes the string to the audit logs tagged with the specific change control
    calling the script
 
+Required Arguments
+   switchType - Model name, the modelName in show version must contain it
+
+Optional Arguments
+   eosVersion - Comma separated list of allowed EOS versions, a version matches if it starts with one of them
+   deviceList - Comma separated list of switches to check in one pass instead of only the switch the script
+                runs for, the results are written to the audit log as a single entry
+   parallelDevices - Number of switches queried at the same time in fleet mode, default 16
+   cacheTTL   - Fleet mode only. Seconds the show version output of a switch is reused for by later checks
+                in the same CVP session, so checks repeated during a change control do not query the
+                switches again. Default 0, the cache is off. Do not use it for checks which run after
+                an EOS upgrade
+
 Smaple yaml file
    name : check_switchType
    args:
       switchType : vEOS
+      eosVersion : 4.22,4.23
+      deviceList : 10.83.30.101,10.83.30.102
 
 """
 # Import required Librarys
+import hashlib
 import json
+import os
+import re
+import tempfile
+import threading
+import time
 from cvplibrary.auditlogger import alog # CVP auit log function
 from cvplibrary import Device, CVPGlobalVariables, GlobalVariableNames # CVP Variables
 
+try:
+    from cvplibrary import ccm_helpers # Parallel helpers, see ccm_helpers.py
+except ImportError:
+    import ccm_helpers
+
+def cacheFile(sessionId):
+    """ show version and show hostname output is cached per switch in one
+      file per CVP session, so a check never sees facts from another session
+    """
+    return os.path.join(tempfile.gettempdir(),
+                        'check_switchType_%s.json' %hashlib.sha1(sessionId).hexdigest()[:16])
+
+def loadCache():
+    """ Read the cached switch facts, entries older than cacheTTL are dropped
+    """
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    now = time.time()
+    return dict((ip, entry) for ip, entry in cache.items() if now - entry['time'] < cache_ttl)
+
+def saveCache(cache):
+    """ Write the cache to a temporary file and rename it, so a script
+      running at the same time never reads a partial file
+    """
+    tmpFile = '%s.%d' %(cache_file, os.getpid())
+    with open(tmpFile, 'w') as f:
+        json.dump(cache, f)
+    os.rename(tmpFile, cache_file)
+
+def getFacts(ipAddress):
+    """ Run show version and show hostname on a switch, or use the cached
+      output. Results are stored in facts[ipAddress]
+    """
+    if ipAddress in cache:
+        facts[ipAddress] = cache[ipAddress]
+        return
+    try:
+        # Connect to Device and run show commands on switch
+        cmdOut = Device(ipAddress).runCmds(["show version","show hostname"])
+        entry = {'time': time.time(),
+                 'hostname': cmdOut[1]["response"]["hostname"],
+                 'modelName': cmdOut[0]["response"]["modelName"],
+                 'version': cmdOut[0]["response"]["version"]}
+    except Exception as e:
+        facts[ipAddress] = {'error': str(e)}
+        return
+    with lock:
+        cache[ipAddress] = entry
+    facts[ipAddress] = entry
+
+def checkFacts(entry):
+    """ Check the facts of a switch, returns the log text and whether it passed
+    """
+    if 'error' in entry:
+        return "WARNING: switch could not be checked: %s" %entry['error'], False
+    if str(scriptArgs['switchType']) not in entry["modelName"]:
+        return "WARNING: switch %s is not a %s it is a %s" %(entry["hostname"],
+                                                          scriptArgs['switchType'],
+                                                          entry["modelName"]), False
+    if eos_versions and not any(entry["version"].startswith(version) for version in eos_versions):
+        return "WARNING: switch %s runs EOS %s not %s" %(entry["hostname"], entry["version"],
+                                                      " or ".join(eos_versions)), False
+    return "SUCCESS: switch %s is a %s running EOS %s" %(entry["hostname"], entry["modelName"],
+                                                        entry["version"]), True
+
 # Create Script variables
 ipAddress = CVPGlobalVariables.getValue( GlobalVariableNames.CVP_IP)
 scriptArgs = CVPGlobalVariables.getValue( GlobalVariableNames.SCRIPT_ARGS)
+eos_versions = [version for version in re.split(',', str(scriptArgs.get('eosVersion', ''))) if version]
+session_id = CVPGlobalVariables.getValue( GlobalVariableNames.CVP_SESSION_ID)
+# The cache is only used in fleet mode and within one CVP session. A single switch is always
+# queried, its check usually follows a change to it
+cache_ttl = float(scriptArgs.get('cacheTTL', 0))
+use_cache = bool(scriptArgs.get('deviceList')) and cache_ttl > 0 and bool(session_id)
+cache_file = cacheFile(str(session_id)) if use_cache else None
+cache = loadCache() if use_cache else {}
+lock = threading.Lock()
+facts = {}
 
-# Write entry to Log
-alog("running show version from script to check switch type")
-# Connect to Device specified in Change Control
-switch = Device(ipAddress)
-# Run show commands on switch
-cmdOut = switch.runCmds(["show version","show hostname"])
-# Check if the switch type is correct
-if str(scriptArgs['switchType']) not in cmdOut[0]["response"]["modelName"]:
-    logTxt = "WARNING: switch %s is not a %s it is a %s" %(cmdOut[1]["response"]["hostname"],
-                                                  scriptArgs['switchType'],
-                                                  cmdOut[0]["response"]["modelName"])
-    alog(logTxt)
-    assert(False)
+if scriptArgs.get('deviceList'):
+    # Fleet mode, check every switch in one pass and log a single entry
+    deviceList = re.split(',', scriptArgs['deviceList'])
+    ccm_helpers.waitFor(ccm_helpers.runParallel(getFacts, deviceList, int(scriptArgs.get('parallelDevices', 16))),
+                        None)
+    if use_cache:
+        saveCache(cache)
+    failed = []
+    lines = []
+    for device in deviceList:
+        logTxt, ok = checkFacts(facts[device])
+        lines.append("%s: %s" %(device, logTxt))
+        if not ok:
+            failed.append(device)
+    alog("check_switchType: %s of %s switches passed\n%s" %(len(deviceList) - len(failed), len(deviceList),
+                                                             "\n".join(lines)))
+    assert(not failed)
 else:
-    logTxt = "SUCCESS: switch %s is a %s" %(cmdOut[1]["response"]["hostname"],
-                                            cmdOut[0]["response"]["modelName"])
+    # Write entry to Log
+    alog("running show version from script to check switch type")
+    getFacts(ipAddress)
+    logTxt, ok = checkFacts(facts[ipAddress])
     alog(logTxt)
+    assert(ok)
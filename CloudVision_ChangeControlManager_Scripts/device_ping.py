@@ -55,10 +55,22 @@ Required Arguments
    passmark   - Percentage of recieved Pings required to Pass each Ping test
    failCount  - Number of Ping Tests that can fail before ping_device fails
    username   - Username to access devices
-   password   - Password to use to access devices
+   password   - Password to use to access devices, leave out to use keyFile or the ssh agent instead
    pingCount  - Number of Pings to send
    timeout    - Ping timeout
 
+Optional Arguments
+   deadline       - Seconds the whole test may take, pings still running then count as failed
+   parallelDevices - Number of devices in deviceList to ping from at the same time, default 16
+   parallelPings  - Number of targets each device pings at the same time, default 8. Keep this below
+                    MaxSessions in the sshd config of the devices, 10 by default
+   keyFile        - Private key file to log in to the devices with
+   port           - SSH port of the devices, default 22
+   earlyExit      - True to stop as soon as enough pings passed or failed to decide the result,
+                    the pings still outstanding are cancelled and only the completed ones are logged
+   batch          - True to send all the pings of a device as one remote command instead of one
+                    command per target, parallelPings is not used then
+
 Smaple yaml file
    name : device_ping
    args:
@@ -77,9 +89,15 @@ from cvplibrary.auditlogger import alog # CVP auit log function
 from cvplibrary import Device, CVPGlobalVariables, GlobalVariableNames # CVP Variables
 from cvplibrary.request_session import RequestSession
 
+try:
+    from cvplibrary import ccm_helpers # Shared SSH connections, see ccm_helpers.py
+except ImportError:
+    import ccm_helpers
+
 # Import Python Libraries
-import paramiko
+import pipes
 import re
+import time
 
 # Check to see if this script is being tested or run in CVP
 test = False
@@ -96,45 +114,162 @@ def outMsg(test,msgTxt):
     else:
         alog(msgTxt)
 
+def pingResult(output):
+    """ Extract the percentage of pings received from the ping output,
+      None if the output has no ping statistics
+    """
+    if len(output) < 2:
+        return None
+    ping_stats = re.split(',', output[-2])
+    if len(ping_stats) < 3:
+        return None
+    ping_pkl = re.split('(\d+)',ping_stats[2])[1]
+    return 100-int(ping_pkl)
+
+# One line per target from the batch ping script, identified by its position in the target list.
+# The ping summary is empty if ping failed outright
+BATCH_RESULT = re.compile(r'^PING_RESULT (\d+) (?:(\d+) packets transmitted, (\d+) (?:packets )?received.*?'
+                          r'([\d.]+)% packet loss)?')
+
+def batchScript(targets):
+    """ Shell script pinging all targets at the same time, each ping prints
+      a single PING_RESULT line so the lines of concurrent pings never mix
+    """
+    lines = []
+    for index, target in enumerate(targets):
+        lines.append('(r=$(ping -q -c %s -w %s %s 2>&1 | grep "packet loss"); echo "PING_RESULT %d $r") &'
+                     %(int(scriptArgs['pingCount']), int(scriptArgs['timeout']), pipes.quote(target), index))
+    lines.append('wait')
+    return 'sh -c %s' %pipes.quote('\n'.join(lines))
+
+def batchResults(targets, output):
+    """ Parse the output of the batch ping script into a dictionary
+      of target: percentage of pings received, None if ping failed
+    """
+    received = {}
+    for line in output:
+        match = BATCH_RESULT.match(line)
+        if not match or int(match.group(1)) >= len(targets):
+            continue
+        index, ping_tx, ping_rx, ping_pkl = match.groups()
+        received[targets[int(index)]] = 100-int(float(ping_pkl)) if ping_pkl is not None else None
+    return received
+
+def pingPassed(ping_pkr):
+    return ping_pkr is not None and int(ping_pkr) >= int(scriptArgs['passmark'])
+
+def storeResult(device_ip, target, ping_pkr):
+    """ Store the result of one ping and count it towards the verdict
+    """
+    results[(device_ip, target)] = ping_pkr
+    if quorum is not None:
+        quorum.record(pingPassed(ping_pkr))
+
+def remaining():
+    """ Seconds left until the deadline, None if there is no deadline
+    """
+    if deadline is None:
+        return None
+    return max(deadline - time.time(), 0)
+
+def pingFromDevice(device_ip):
+    """ Ping every target from device_ip, the targets are pinged in parallel
+      over one SSH connection. Results are stored in results[(device_ip, target)]
+    """
+    try:
+        pool.client(device_ip, remaining())
+    except Exception as e:
+        errors[device_ip] = str(e)
+        for target in scriptArgs['targetList']:
+            storeResult(device_ip, target, None)
+        return
+    if batch:
+        received = {}
+        try:
+            output, error = pool.exec_command(device_ip, batchScript(scriptArgs['targetList']), timeout=remaining(),
+                                              stop=stop)
+            received = batchResults(scriptArgs['targetList'], output)
+        except ccm_helpers.CommandCancelled:
+            # The result was decided without these pings
+            return
+        except Exception as e:
+            errors[device_ip] = str(e)
+        for target in scriptArgs['targetList']:
+            storeResult(device_ip, target, received.get(target))
+        return
+    def pingTarget(target):
+        try:
+            output, error = pool.exec_command(device_ip, 'ping -c %s -w %s %s' %(scriptArgs['pingCount'],
+                                                                                scriptArgs['timeout'],target),
+                                              timeout=remaining(), stop=stop)
+            storeResult(device_ip, target, pingResult(output))
+        except ccm_helpers.CommandCancelled:
+            pass
+        except Exception:
+            storeResult(device_ip, target, None)
+    ccm_helpers.waitFor(ccm_helpers.runParallel(pingTarget, scriptArgs['targetList'], parallel_pings, stop), deadline,
+                        stop)
+
 # Create Script variables
 scriptArgs = CVPGlobalVariables.getValue( GlobalVariableNames.SCRIPT_ARGS)
 scriptArgs['deviceList']=re.split(',',scriptArgs['deviceList'])
 scriptArgs['targetList']=re.split(',',scriptArgs['targetList'])
 
 # Internal Variables
-host_port = 22
+host_port = int(scriptArgs.get('port', 22))
+parallel_devices = int(scriptArgs.get('parallelDevices', 16))
+parallel_pings = int(scriptArgs.get('parallelPings', 8))
+# Connections are shared with other scripts run with the same credentials in this interpreter
+pool = ccm_helpers.getPool(scriptArgs['username'], scriptArgs.get('password'), scriptArgs.get('keyFile'),
+                           host_port, max_sessions=parallel_pings, max_connections=parallel_devices)
+batch = str(scriptArgs.get('batch', False)).lower() in ('true', 'yes', '1')
+deadline = None
+if scriptArgs.get('deadline'):
+    deadline = time.time() + float(scriptArgs['deadline'])
 passed = 0
 failed = 0
+# Received percentage per (device, target), None if the ping did not complete
+results = {}
+# With earlyExit the test stops as soon as the number of failures decides the result
+quorum = None
+stop = None
+if str(scriptArgs.get('earlyExit', False)).lower() in ('true', 'yes', '1'):
+    quorum = ccm_helpers.Quorum(len(scriptArgs['deviceList']) * len(scriptArgs['targetList']),
+                                int(scriptArgs['failCount']))
+    stop = quorum.done
+# Connection errors per device
+errors = {}
 
 # Write entry to Log
 outMsg(test, "device_ping - checking endpoint connectivity")
 
-# Intialise SSH
-ssh = paramiko.SSHClient()
-ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+# Start ping tests from all devices in deviceList at once
+ccm_helpers.waitFor(ccm_helpers.runParallel(pingFromDevice, scriptArgs['deviceList'], parallel_devices, stop),
+                    deadline, stop)
 
-# Start ping tests from devices in deviceList
+# Check Ping Results and Log them, in the same order as they were listed.
+# Pings still running at the deadline are cancelled and count as failed,
+# pings cancelled because the result was already decided are not counted
+results = dict(results)
+cancelled = 0
 for device_ip in scriptArgs['deviceList']:
-    outMsg(test, "device_ping: Connecting to %s" %device_ip)
-    ssh.connect(device_ip, port=host_port, username=scriptArgs['username'], password=scriptArgs['password'])
+    if device_ip in errors:
+        outMsg(test, "device_ping: Connecting to %s - Failed: %s" %(device_ip, errors[device_ip]))
     for target in scriptArgs['targetList']:
-        stdin, stdout, stderr = ssh.exec_command('ping -c %s -w %s %s' %(scriptArgs['pingCount'],
-                                                                         scriptArgs['timeout'],target))
-        output = stdout.readlines()
-        # Extract Ping results
-        ping_stats = re.split(',', output[-2])
-        ping_tx = re.split('(\d+)',ping_stats[0])[1]
-        ping_rx = re.split('(\d+)',ping_stats[1])[1]
-        ping_pkl = re.split('(\d+)',ping_stats[2])[1]
-        ping_pkr = 100-int(ping_pkl)
-        # Check Ping Results and Log them
-        if int(ping_pkr) >= int(scriptArgs['passmark']):
+        if quorum is not None and quorum.verdict is not None and (device_ip, target) not in results:
+            cancelled += 1
+            continue
+        ping_pkr = results.get((device_ip, target))
+        if pingPassed(ping_pkr):
             outMsg(test, "device_ping: Ping form %s to %s - Pass" %(device_ip, target))
             passed += 1
         else:
+            if ping_pkr is None and device_ip not in errors:
+                outMsg(test, "device_ping: Ping form %s to %s - did not complete" %(device_ip, target))
             outMsg(test, "device_ping: Ping form %s to %s - Failed" %(device_ip, target))
             failed += 1
-    ssh.close()
+if cancelled:
+    outMsg(test, "device_ping: Result decided early, %s ping(s) were cancelled" %cancelled)
 # If number of Ping tests that failed exceeds failCount
 # fail the whole test
 if int(scriptArgs['failCount']) > failed:
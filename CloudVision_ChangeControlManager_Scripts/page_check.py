@@ -50,13 +50,24 @@ Audit Logging function
    calling the script
 
 Required Arguments
-   pageURL - web page to look for
+   pageURL - web page to look for, or a comma separated list of pages
    deviceList - list of devices to check from
    failCount  - Number of Page Tests that can fail before web_check fails
    username   - Username to access devices
-   password   - Password to use to access devices
+   password   - Password to use to access devices, leave out to use keyFile or the ssh agent instead
    timeout    - How long to wait for a response
 
+Optional Arguments
+   keyFile    - Private key file to log in to the devices with
+   port       - SSH port of the devices, default 22
+   expectStatus - Comma separated list of HTTP status codes which pass, default 200
+   maxLatency - Seconds the latencyPercentile of the total request time of each page may take,
+                the check fails if any page is slower. Not checked if left out
+   latencyPercentile - Percentile of the request times compared with maxLatency, default 95
+   parallelChecks - Number of page checks run at the same time, default 16
+   earlyExit  - True to stop as soon as enough checks failed, or passed when maxLatency is not set, to
+                decide the result. Outstanding checks are cancelled and only completed ones are logged
+
 Smaple yaml file
    name : page_check
    args:
@@ -73,8 +84,15 @@ from cvplibrary.auditlogger import alog # CVP auit log function
 from cvplibrary import Device, CVPGlobalVariables, GlobalVariableNames # CVP Variables
 from cvplibrary.request_session import RequestSession
 
+try:
+    from cvplibrary import ccm_helpers # Shared SSH connections, see ccm_helpers.py
+except ImportError:
+    import ccm_helpers
+
 # Import Python Libraries
-import paramiko
+import json
+import math
+import pipes
 import re
 
 # Check to see if this script is being tested or run in CVP
@@ -92,49 +110,137 @@ def outMsg(test,msgTxt):
     else:
         alog(msgTxt)
 
+# Timing fields reported by curl, in the order they are written out
+TIMINGS = ['namelookup', 'connect', 'appconnect', 'starttransfer', 'total']
+CURL_FORMAT = 'PAGE_RESULT %{http_code} ' + ' '.join('%%{time_%s}' %timing for timing in TIMINGS) + '\\n'
+CURL_RESULT = re.compile(r'^PAGE_RESULT (\d{3})' + r' ([\d.]+)' * len(TIMINGS))
+
+def curlCommand(url):
+    """ curl command fetching the headers of url and writing out
+      the status code and timings on one line
+    """
+    return 'curl --insecure -sS -I -o /dev/null -m %s -w %s %s' %(int(scriptArgs['timeout']),
+                                                                  pipes.quote(CURL_FORMAT), pipes.quote(url))
+
+def curlResult(output):
+    """ Parse the curl output into the status code and a dictionary of
+      timing: seconds, None if curl did not write out a result
+    """
+    for line in output:
+        match = CURL_RESULT.match(line)
+        if match:
+            return int(match.group(1)), dict(zip(TIMINGS, [float(value) for value in match.groups()[1:]]))
+    return None
+
+def percentile(values, pct):
+    """ Nearest rank percentile of a list of values
+    """
+    values = sorted(values)
+    rank = int(math.ceil(pct / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+def checkPage(check):
+    """ Fetch one page from one device, the result is stored in results[check]
+    """
+    device_ip, url = check
+    try:
+        output, error = pool.exec_command(device_ip, curlCommand(url), stop=stop)
+        result = curlResult(output)
+        # curl reports status 000 when it got no response at all
+        if result is None or result[0] == 0:
+            results[check] = (None, None, error[-1].strip() if error else "no response")
+        else:
+            results[check] = (result[0], result[1], error[-1].strip() if error else "")
+    except ccm_helpers.CommandCancelled:
+        # The result was decided without this check
+        return
+    except Exception as e:
+        results[check] = (None, None, str(e))
+    if quorum is not None:
+        quorum.record(results[check][0] in expect_status)
+
 # Create Script variables
 scriptArgs = CVPGlobalVariables.getValue( GlobalVariableNames.SCRIPT_ARGS)
 scriptArgs['deviceList']=re.split(',',scriptArgs['deviceList'])
+scriptArgs['pageURL']=re.split(',',scriptArgs['pageURL'])
 
 # Internal Variables
-host_port = 22
+host_port = int(scriptArgs.get('port', 22))
+expect_status = [int(status) for status in re.split(',', str(scriptArgs.get('expectStatus', 200)))]
+max_latency = float(scriptArgs['maxLatency']) if scriptArgs.get('maxLatency') else None
+latency_percentile = float(scriptArgs.get('latencyPercentile', 95))
+parallel_checks = int(scriptArgs.get('parallelChecks', 16))
 passed = 0
 failed = 0
+slow = []
+# (status, timings, error) per (device, url)
+results = {}
+# With earlyExit the test stops as soon as the number of failures decides the result. If maxLatency
+# is set all pages are needed to pass, so only a failure can end the test early
+quorum = None
+stop = None
+if str(scriptArgs.get('earlyExit', False)).lower() in ('true', 'yes', '1'):
+    quorum = ccm_helpers.Quorum(len(scriptArgs['deviceList']) * len(scriptArgs['pageURL']),
+                                int(scriptArgs['failCount']), decidePass=max_latency is None)
+    stop = quorum.done
 
 # Write entry to Log
 outMsg(test, "page_check - check Web Page connectivity")
 
-# Intialise SSH
-ssh = paramiko.SSHClient()
-ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-# Start ping tests from devices in deviceList
-for device_ip in scriptArgs['deviceList']:
-   outMsg(test, "page_check: Connecting to %s" %device_ip)
-   ssh.connect(device_ip, port=host_port, username=scriptArgs['username'], password=scriptArgs['password'])
-   stdin, stdout, stderr = ssh.exec_command('curl --insecure -I -m %s %s' %(scriptArgs['timeout'],scriptArgs['pageURL']))
-   output = stdout.readlines()
-   error = stderr.readlines()
-   if "Failed" in str(error[-1]) or "Error" in str(error[-1]):
-      outMsg(test, "page_check: Access form %s to %s: Failed (1)" %(device_ip, scriptArgs['pageURL']))
-      outMsg(test,"page_check: %s" %error[-1])
+# Connections are shared with other scripts run with the same credentials in this interpreter
+pool = ccm_helpers.getPool(scriptArgs['username'], scriptArgs.get('password'), scriptArgs.get('keyFile'), host_port)
+
+# Check every page from every device in deviceList at once
+checks = [(device_ip, url) for device_ip in scriptArgs['deviceList'] for url in scriptArgs['pageURL']]
+ccm_helpers.waitFor(ccm_helpers.runParallel(checkPage, checks, parallel_checks, stop), None, stop)
+
+# Check the results and log them, in the same order as they were listed. Checks
+# cancelled because the result was already decided are not counted
+results = dict(results)
+cancelled = 0
+for device_ip, url in checks:
+   if (device_ip, url) not in results:
+      cancelled += 1
+      continue
+   status, timings, error = results[(device_ip, url)]
+   if status is None:
+      outMsg(test, "page_check: Access form %s to %s: Failed (1)" %(device_ip, url))
+      outMsg(test,"page_check: %s" %error)
       failed += 1
+   elif status in expect_status:
+      outMsg(test, "page_check: Access form %s to %s: Pass (status %s, %s)" %(device_ip, url, status,
+             ", ".join("%s %.3fs" %(timing, timings[timing]) for timing in TIMINGS)))
+      passed += 1
    else:
-      if "200 OK" in output[0]:
-         outMsg(test, "page_check: Access form %s to %s: Pass" %(device_ip, scriptArgs['pageURL']))
-         passed += 1
-      else:
-         outMsg(test, "page_check: Access form %s to %s: Failed (2)" %(device_ip, scriptArgs['pageURL']))
-         outMsg(test,"page_check: %s" %output[0])
-         failed += 1
-   ssh.close()
-# If number of Page tests that failed exceeds failCount
-# fail the whole test
-if int(scriptArgs['failCount']) > failed:
-   outMsg(test, "page_check: Passed - Number of failures must be less than %s. %s devices can access %s" %(scriptArgs['failCount'],
-                                                                                              passed,scriptArgs['pageURL']))
+      outMsg(test, "page_check: Access form %s to %s: Failed (2)" %(device_ip, url))
+      outMsg(test,"page_check: status %s" %status)
+      failed += 1
+
+# Timing summary of each page over the devices which reached it
+for url in scriptArgs['pageURL']:
+   times = [results[(device_ip, url)][1] for device_ip in scriptArgs['deviceList']
+            if results.get((device_ip, url), (None,))[0] in expect_status]
+   if not times:
+      continue
+   summary = {'url': url, 'devices': len(times)}
+   for timing in TIMINGS:
+      summary[timing] = {'p50': percentile([t[timing] for t in times], 50),
+                         'p%g' %latency_percentile: percentile([t[timing] for t in times], latency_percentile)}
+   outMsg(test, "page_check: timing %s" %json.dumps(summary, sort_keys=True))
+   total = percentile([t['total'] for t in times], latency_percentile)
+   if max_latency is not None and total > max_latency:
+      outMsg(test, "page_check: %s p%g total time %.3fs is over %ss" %(url, latency_percentile, total, max_latency))
+      slow.append(url)
+
+if cancelled:
+   outMsg(test, "page_check: Result decided early, %s check(s) were cancelled" %cancelled)
+# If number of Page tests that failed exceeds failCount, or a page
+# was too slow, fail the whole test
+if int(scriptArgs['failCount']) > failed and not slow:
+   outMsg(test, "page_check: Passed - Number of failures must be less than %s. %s checks could access %s" %(scriptArgs['failCount'],
+                                                                                              passed,", ".join(scriptArgs['pageURL'])))
 else:
-   outMsg(test, "page_check: Failed - Number of failures must be less than %s. %s devices were not able to access %s" %(scriptArgs['failCount'],
-                                                                                                                         failed,scriptArgs['pageURL']))
+   outMsg(test, "page_check: Failed - Number of failures must be less than %s. %s checks were not able to access %s, %s pages were too slow" %(scriptArgs['failCount'],
+                                                                                                                         failed,", ".join(scriptArgs['pageURL']),len(slow)))
    if not test:
       raise UserWarning("page_check: Failed")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2019, Arista Networks
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Benchmark for the CCM scripts against simulated devices
+
+Runs a CCM script against increasing numbers of simulated devices from fakedevices.py and
+reports the wall time of each run, the verdict and the number of SSH connections and commands
+the script used. Extra script arguments can be given as JSON to compare modes, for example:
+
+   benchmark.py --script device_ping --devices 1,10,50 --targets 20
+   benchmark.py --script device_ping --devices 1,10,50 --targets 20 --args '{"batch": true}'
+   benchmark.py --script page_check --devices 10,100 --urls 3 --unreachable 0.1 --args '{"earlyExit": true}'
+   benchmark.py --script check_switchType --devices 10,100
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = os.path.dirname(HERE)
+# The cvplibrary stand-in and the scripts' own modules
+sys.path.insert(0, SCRIPTS)
+sys.path.insert(0, HERE)
+
+import runpy
+
+import cvplibrary
+from cvplibrary import auditlogger
+import ccm_helpers
+import fakedevices
+
+USERNAME = 'cvpadmin'
+PASSWORD = 'arista'
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='CCM script benchmark')
+    parser.add_argument('--script', default='device_ping', choices=['device_ping', 'page_check', 'check_switchType'],
+                        help='Script to run')
+    parser.add_argument('--devices', default='1,10,50', help='Comma separated numbers of devices to run with')
+    parser.add_argument('--targets', type=int, default=10, help='Number of ping targets for device_ping')
+    parser.add_argument('--urls', type=int, default=1, help='Number of pages for page_check')
+    parser.add_argument('--loss', type=float, default=0.0, help='Probability each ping packet is lost')
+    parser.add_argument('--unreachable', type=float, default=0.0,
+                        help='Fraction of ping targets and page hosts which never answer')
+    parser.add_argument('--latency', type=float, default=0.001, help='Ping round trip time in seconds')
+    parser.add_argument('--ping-interval', type=float, default=0.01, help='Seconds between ping packets')
+    parser.add_argument('--page-latency', type=float, default=0.005, help='Seconds a page request takes')
+    parser.add_argument('--eapi-latency', type=float, default=0.005, help='Seconds an eAPI request takes')
+    parser.add_argument('--args', default='{}', help='Extra script arguments as a JSON object')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the simulated network')
+    return parser.parse_args()
+
+
+def scriptArgs(options, devices, port):
+    """ Arguments for the script, as they would be given in its yaml file
+    """
+    if options.script == 'device_ping':
+        targets = ['10.0.%d.%d' %(i // 250, i % 250 + 1) for i in range(options.targets)]
+        args = {'deviceList': ','.join(devices), 'targetList': ','.join(targets), 'passmark': 100,
+                'failCount': len(devices) * len(targets), 'pingCount': 5, 'timeout': 5}
+    elif options.script == 'page_check':
+        urls = ['https://10.1.%d.%d/page' %(i // 250, i % 250 + 1) for i in range(options.urls)]
+        args = {'deviceList': ','.join(devices), 'pageURL': ','.join(urls), 'failCount': len(devices) * len(urls),
+                'timeout': 1}
+    else:
+        args = {'switchType': 'vEOS', 'deviceList': ','.join(devices), 'cacheTTL': 0}
+    args.update({'username': USERNAME, 'password': PASSWORD, 'port': port})
+    args.update(json.loads(options.args))
+    return args
+
+
+def run(options, size, ssh):
+    devices = ['127.1.%d.%d' %(i // 250, i % 250 + 1) for i in range(size)]
+    args = scriptArgs(options, devices, ssh.port)
+    rand = random.Random(options.seed)
+    unreachable = [target for target in args.get('targetList', '').split(',') if rand.random() < options.unreachable]
+    unreachable += ['10.1.%d.%d' %(i // 250, i % 250 + 1) for i in range(options.urls)
+                    if rand.random() < options.unreachable]
+    network = fakedevices.FakeNetwork(loss=options.loss, unreachable=unreachable, latency=options.latency,
+                                      pingInterval=options.ping_interval, pageLatency=options.page_latency,
+                                      eapiLatency=options.eapi_latency, seed=options.seed)
+    ssh.network = network
+    ssh.connections = 0
+    eapi = fakedevices.FakeEapiServer(network).start()
+    cvplibrary.EAPI_PORT = eapi.port
+    cvplibrary.GLOBALS.clear()
+    cvplibrary.GLOBALS.update({'SCRIPT_ARGS': args, 'CVP_IP': devices[0], 'CVP_SESSION_ID': 'benchmark',
+                               'CVP_USERNAME': USERNAME, 'CVP_PASSWORD': PASSWORD})
+    del auditlogger.LOG[:]
+    # Every run starts without open connections
+    ccm_helpers.closePools()
+
+    start = time.time()
+    try:
+        runpy.run_path(os.path.join(SCRIPTS, options.script + '.py'), run_name='__main__')
+        verdict = 'pass'
+    except (UserWarning, AssertionError):
+        verdict = 'fail'
+    elapsed = time.time() - start
+    eapi.stop()
+
+    commands = sum(network.commands.values())
+    print('%8d %10.2f %8s %10d %10d' %(size, elapsed, verdict, ssh.connections, commands))
+
+
+def main():
+    options = parseArgs()
+    auditlogger.PRINT = False
+    ssh = fakedevices.FakeSSHServer(None, USERNAME, PASSWORD).start()
+    print('%s %s' %(options.script, options.args))
+    print('%8s %10s %8s %10s %10s' %('devices', 'seconds', 'verdict', 'ssh conns', 'commands'))
+    try:
+        for size in options.devices.split(','):
+            run(options, int(size), ssh)
+    finally:
+        ssh.stop()
+
+
+if __name__ == '__main__':
+    main()
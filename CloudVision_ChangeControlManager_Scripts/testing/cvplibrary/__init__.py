@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2019, Arista Networks
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Local stand-in for the cvplibrary package CVP provides to CCM scripts
+
+Lets the CCM scripts run outside CVP, see the Testing section of the README. The values returned by
+CVPGlobalVariables.getValue are taken from GLOBALS, set them before running a script. Device
+sends its commands as eAPI JSON-RPC requests to http://<ip>:EAPI_PORT/command-api, point
+EAPI_PORT at a FakeEapiServer from fakedevices.py.
+"""
+import json
+import urllib2
+
+# Values returned by CVPGlobalVariables.getValue, keyed by GlobalVariableNames
+GLOBALS = {}
+# Port Device sends eAPI requests to
+EAPI_PORT = 80
+
+
+class GlobalVariableNames(object):
+    CVP_USERNAME = 'CVP_USERNAME'
+    CVP_PASSWORD = 'CVP_PASSWORD'
+    CVP_IP = 'CVP_IP'
+    CVP_MAC = 'CVP_MAC'
+    CVP_SERIAL = 'CVP_SERIAL'
+    CVP_SESSION_ID = 'CVP_SESSION_ID'
+    SCRIPT_ARGS = 'SCRIPT_ARGS'
+
+
+class CVPGlobalVariables(object):
+    @staticmethod
+    def getValue(name):
+        value = GLOBALS.get(name)
+        # The scripts change their arguments in place, hand out a copy
+        if isinstance(value, dict):
+            value = dict(value)
+        return value
+
+
+class Device(object):
+    """ eAPI connection to a switch
+    """
+    def __init__(self, ipAddress, username=None, password=None):
+        self.ipAddress = ipAddress
+
+    def runCmds(self, cmds):
+        request = json.dumps({'jsonrpc': '2.0', 'method': 'runCmds', 'id': 1,
+                              'params': {'version': 1, 'cmds': cmds, 'format': 'json'}})
+        reply = json.load(urllib2.urlopen('http://%s:%d/command-api' %(self.ipAddress, EAPI_PORT), request))
+        if 'error' in reply:
+            raise Exception(reply['error']['message'])
+        return [{'command': cmd, 'response': response} for cmd, response in zip(cmds, reply['result'])]
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2019, Arista Networks
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Simulated devices for testing the CCM scripts locally
+
+FakeNetwork   - behaviour of the simulated network: ping loss and latency, page status codes and
+                request times, and the model and EOS version each switch reports
+FakeSSHServer - SSH server answering the ping, batched ping script and curl commands the scripts
+                send with simulated output
+FakeEapiServer - eAPI server answering show version and show hostname
+
+Both servers listen on all addresses and only accept connections to and from loopback
+addresses, every address in 127.0.0.0/8 is a separate simulated device. No real pings or page
+requests are made, the simulated times are slept for so the scripts see realistic delays.
+"""
+import BaseHTTPServer
+import json
+import random
+import re
+import shlex
+import socket
+import SocketServer
+import threading
+import time
+
+import paramiko
+
+PING = re.compile(r'^ping (?:-q )?-c (\d+) -w (\d+) (\S+)$')
+BATCH_PING = re.compile(r'ping -q -c (\d+) -w (\d+) (.+?) 2>&1 .*PING_RESULT (\d+)')
+CURL_TIMING = re.compile(r'%\{(\w+)\}')
+
+
+class FakeNetwork(object):
+    """ Behaviour of the simulated network
+
+    Variables:
+    self.loss - probability each ping packet is lost
+    self.unreachable - set of targets which never answer pings or page requests
+    self.latency - round trip time of a ping in seconds
+    self.pingInterval - seconds between the packets of a ping, ping waits 1 second by default
+    self.pageStatus - dictionary of url: HTTP status code, pages not listed return 200
+    self.pageLatency - seconds a page request takes
+    self.eapiLatency - seconds an eAPI request takes
+    self.models - dictionary of ip: (modelName, version), switches not listed are ('vEOS', '4.22.1F')
+    self.commands - number of requests as kv pair kind: count, kind is ssh for commands and eapi for eAPI requests
+    """
+
+    def __init__(self, loss=0.0, unreachable=(), latency=0.001, pingInterval=0.01, pageStatus=None,
+                 pageLatency=0.005, eapiLatency=0.005, models=None, seed=None):
+        self.loss = loss
+        self.unreachable = set(unreachable)
+        self.latency = latency
+        self.pingInterval = pingInterval
+        self.pageStatus = pageStatus or {}
+        self.pageLatency = pageLatency
+        self.eapiLatency = eapiLatency
+        self.models = models or {}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.commands = {}
+
+    def count(self, kind):
+        with self.lock:
+            self.commands[kind] = self.commands.get(kind, 0) + 1
+
+    def ping(self, count, deadline, target):
+        """ Simulate ping -c count -w deadline target, returns the summary
+          lines iputils ping prints
+        """
+        with self.lock:
+            received = sum(1 for i in range(count)
+                           if target not in self.unreachable and self.random.random() >= self.loss)
+        duration = min((count - 1) * self.pingInterval + self.latency, deadline)
+        time.sleep(duration)
+        loss = 100.0 * (count - received) / count
+        lines = ['PING %s (%s) 56(84) bytes of data.' %(target, target), '',
+                 '--- %s ping statistics ---' %target,
+                 '%d packets transmitted, %d received, %g%% packet loss, time %dms'
+                 %(count, received, loss, duration * 1000)]
+        if received:
+            rtt = self.latency * 1000
+            lines.append('rtt min/avg/max/mdev = %.3f/%.3f/%.3f/0.000 ms' %(rtt, rtt, rtt))
+        else:
+            lines.append('')
+        return lines
+
+    def batchPing(self, script):
+        """ Simulate the batched ping script from device_ping, all pings run
+          at the same time
+        """
+        output = []
+        def run(match):
+            count, deadline, target, index = match.groups()
+            summary = [line for line in self.ping(int(count), int(deadline), shlex.split(target)[0])
+                       if 'packet loss' in line]
+            output.append('PING_RESULT %s %s' %(index, summary[0] if summary else ''))
+        threads = [threading.Thread(target=run, args=(match,)) for match in BATCH_PING.finditer(script)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return output
+
+    def curl(self, args):
+        """ Simulate curl, only the -m and -w options are used
+        """
+        url = args[-1]
+        timeout = float(args[args.index('-m') + 1]) if '-m' in args else None
+        writeOut = args[args.index('-w') + 1] if '-w' in args else ''
+        host = re.sub(r'^\w+://', '', url).split('/')[0].split(':')[0]
+        if host in self.unreachable:
+            time.sleep(timeout or 0)
+            values = {'http_code': '000'}
+            error = 'curl: (28) Connection timed out after %d milliseconds' %((timeout or 0) * 1000)
+        else:
+            time.sleep(self.pageLatency)
+            values = {'http_code': '%03d' %self.pageStatus.get(url, 200),
+                      'time_namelookup': 0.0001, 'time_connect': self.latency,
+                      'time_appconnect': self.latency * 2 if url.startswith('https') else 0.0,
+                      'time_starttransfer': self.pageLatency * 0.9, 'time_total': self.pageLatency}
+            error = ''
+        def value(match):
+            found = values.get(match.group(1), 0.0)
+            return found if isinstance(found, str) else '%.6f' %found
+        return [CURL_TIMING.sub(value, writeOut).replace('\\n', '\n')], error
+
+    def run(self, command):
+        """ Run a command sent over SSH, returns stdout, stderr and the exit status
+        """
+        self.count('ssh')
+        match = PING.match(command)
+        if match:
+            return '\n'.join(self.ping(int(match.group(1)), int(match.group(2)), match.group(3))) + '\n', '', 0
+        if command.startswith('sh -c '):
+            return '\n'.join(self.batchPing(shlex.split(command)[2])) + '\n', '', 0
+        if command.startswith('curl '):
+            output, error = self.curl(shlex.split(command))
+            return ''.join(output), error + '\n' if error else '', 28 if error else 0
+        return '', 'sh: %s: command not found\n' %command.split()[0], 127
+
+    def eapi(self, ipAddress, cmds):
+        """ Answer an eAPI runCmds request
+        """
+        self.count('eapi')
+        time.sleep(self.eapiLatency)
+        modelName, version = self.models.get(ipAddress, ('vEOS', '4.22.1F'))
+        responses = []
+        for cmd in cmds:
+            if cmd == 'show version':
+                responses.append({'modelName': modelName, 'version': version, 'serialNumber': 'SN%s' %ipAddress})
+            elif cmd == 'show hostname':
+                responses.append({'hostname': 'switch-%s' %ipAddress.replace('.', '-'),
+                                  'fqdn': 'switch-%s.fake' %ipAddress.replace('.', '-')})
+            else:
+                raise ValueError('Unsupported command %s' %cmd)
+        return responses
+
+
+def isLoopback(address):
+    return address.startswith('127.')
+
+
+class _SSHInterface(paramiko.ServerInterface):
+    def __init__(self, server):
+        self.server = server
+
+    def get_allowed_auths(self, username):
+        return 'password,publickey'
+
+    def check_auth_password(self, username, password):
+        if self.server.password is None or (username, password) == (self.server.username, self.server.password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        thread = threading.Thread(target=self.server.execute, args=(channel, command))
+        thread.daemon = True
+        thread.start()
+        return True
+
+
+class FakeSSHServer(object):
+    """ SSH server for the simulated Linux clients, any key is accepted and
+      the password is only checked if one is given
+    """
+
+    def __init__(self, network, username=None, password=None, port=0):
+        self.network = network
+        self.username = username
+        self.password = password
+        self.hostKey = paramiko.RSAKey.generate(1024)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('', port))
+        self.sock.listen(128)
+        self.port = self.sock.getsockname()[1]
+        self.connections = 0
+        self.transports = []
+        self.running = False
+
+    def start(self):
+        self.running = True
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.sock.close()
+        for transport in self.transports:
+            transport.close()
+
+    def _accept(self):
+        while self.running:
+            try:
+                client, address = self.sock.accept()
+            except socket.error:
+                return
+            if not isLoopback(address[0]) or not isLoopback(client.getsockname()[0]):
+                client.close()
+                continue
+            self.connections += 1
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self.hostKey)
+            self.transports.append(transport)
+            try:
+                transport.start_server(server=_SSHInterface(self))
+            except (paramiko.SSHException, EOFError):
+                transport.close()
+
+    def execute(self, channel, command):
+        stdout, stderr, status = self.network.run(command)
+        try:
+            if stdout:
+                channel.sendall(stdout)
+            if stderr:
+                channel.sendall_stderr(stderr)
+            channel.send_exit_status(status)
+        except socket.error:
+            # The client closed the channel, the command was cancelled
+            pass
+        finally:
+            channel.close()
+
+
+class FakeEapiServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """ eAPI server for the simulated switches, the switch is the address the
+      request was sent to
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, network, port=0):
+        self.network = network
+        BaseHTTPServer.HTTPServer.__init__(self, ('', port), _EapiHandler)
+        self.port = self.server_address[1]
+
+    def verify_request(self, request, client_address):
+        return isLoopback(client_address[0]) and isLoopback(request.getsockname()[0])
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _EapiHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.getheader('Content-Length'))))
+        ipAddress = self.connection.getsockname()[0]
+        try:
+            reply = {'jsonrpc': '2.0', 'id': request.get('id'),
+                     'result': self.server.network.eapi(ipAddress, request['params']['cmds'])}
+        except ValueError as e:
+            reply = {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': 1002, 'message': str(e)}}
+        body = json.dumps(reply)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
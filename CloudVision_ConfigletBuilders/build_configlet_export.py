@@ -0,0 +1,205 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import os
+import json
+import argparse
+import tempfile
+import time
+import zipfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+DATA_FILE = 'configletDataFile.txt'
+# Fixed member date, so the same inputs always produce the same archive
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+FORM_SUFFIX = '.form.json'
+# Scripts may be kept as <name>.txt, the configlet is named without the suffix
+SCRIPT_SUFFIX = '.txt'
+# Files in an example directory which are never configlets, .py files are
+# helper modules imported by the builders (e.g. ipaddress.py)
+IGNORE_SUFFIXES = ('.zip', '.md', '.json', '.py', '.pyc', '.tmp')
+IGNORE_NAMES = ('README', 'README.txt')
+
+encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+
+
+def read_file(path):
+    '''
+    '''
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def configlet_name(filename):
+    '''
+    Name of the configlet kept in filename, without the .txt suffix
+    '''
+    if filename.endswith(SCRIPT_SUFFIX):
+        return filename[:-len(SCRIPT_SUFFIX)]
+    return filename
+
+
+def find_configlets(directory, static=(), exclude=()):
+    '''
+    Find the configlets in a directory, every file is a builder script unless
+    it is listed in static or exclude. The form of builder <name> is read from
+    <name>.form.json if it exists
+
+    Returns two sorted lists of file names, builders and static configlets
+    '''
+    builders = []
+    configlets = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if (not os.path.isfile(path) or name.startswith('.') or name in IGNORE_NAMES
+                or name.endswith(IGNORE_SUFFIXES) or name in exclude):
+            continue
+        if name in static:
+            configlets.append(name)
+        else:
+            builders.append(name)
+    for name in static:
+        if name not in configlets:
+            raise IOError('Static configlet \'{}\' not found in {}'.format(name, directory))
+    return builders, configlets
+
+
+def builder_entry(directory, filename):
+    '''
+    '''
+    name = configlet_name(filename)
+    formPath = os.path.join(directory, name + FORM_SUFFIX)
+    formList = []
+    if os.path.isfile(formPath):
+        formList = json.loads(read_file(formPath))
+    return {
+        'formList': formList,
+        'isAssigned': False,
+        'main_script': {'data': read_file(os.path.join(directory, filename))},
+        'name': name,
+        'type': 'Builder',
+    }
+
+
+def configlet_entry(directory, filename):
+    '''
+    '''
+    name = configlet_name(filename)
+    return {
+        'config': read_file(os.path.join(directory, filename)),
+        'containerCount': 0,
+        'dateTimeInLongFormat': 0,
+        'isAutoBuilder': 'false',
+        'isDefault': 'no',
+        'key': '',
+        'name': name,
+        'netElementCount': 0,
+        'note': '',
+        'reconciled': False,
+        'type': 'Static',
+        'user': '',
+    }
+
+
+def write_data_file(f, directory, builders, configlets):
+    '''
+    Write the configlet data file one configlet at a time, only one script is
+    held in memory while writing
+    '''
+    f.write('{"data":{"configlet":[')
+    for i, name in enumerate(configlets):
+        if i:
+            f.write(',')
+        for chunk in encoder.iterencode(configlet_entry(directory, name)):
+            f.write(chunk)
+    f.write('],"configletBuilder":[')
+    for i, name in enumerate(builders):
+        if i:
+            f.write(',')
+        for chunk in encoder.iterencode(builder_entry(directory, name)):
+            f.write(chunk)
+    f.write(']}}')
+
+
+def build_export(directory, fname, static=(), exclude=()):
+    '''
+    Pack the builders and static configlets of a directory into an export
+    archive which can be imported into CVP
+    '''
+    builders, configlets = find_configlets(directory, static, exclude)
+    fd, tmpPath = tempfile.mkstemp(suffix='.txt')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            write_data_file(f, directory, builders, configlets)
+        # The member takes its date and permissions from the file, fix both
+        os.chmod(tmpPath, 0o644)
+        stamp = time.mktime(ZIP_DATE + (0, 0, -1))
+        os.utime(tmpPath, (stamp, stamp))
+        with zipfile.ZipFile(fname, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            zipf.write(tmpPath, DATA_FILE)
+    finally:
+        os.remove(tmpPath)
+    for name in builders:
+        logging.info('Added builder \'%s\'', name)
+    for name in configlets:
+        logging.info('Added static configlet \'%s\'', name)
+    return builders, configlets
+
+
+def parseArgs():
+    '''
+    '''
+    parser = argparse.ArgumentParser(description='CVP Configlet Export Builder')
+    parser.add_argument('directory', help='Directory with the builder scripts and static configlets')
+    parser.add_argument('--output', default='ExportedConfigletsData.zip', help='Archive to write')
+    parser.add_argument('--static', nargs='*', default=[],
+                        help='Names of the files which are static configlets, all other files are builders')
+    parser.add_argument('--exclude', nargs='*', default=[],
+                        help='Names of other files in the directory which are not configlets')
+    parser.add_argument('--verbose', action='store_true', help='Enable verbose output', default=False)
+    args = parser.parse_args()
+    return args
+
+def main():
+    options = parseArgs()
+
+    if options.verbose:
+        logging.basicConfig(
+            format=u'%(levelname)s: %(message)s',
+            level=logging.INFO)
+
+    build_export(options.directory, options.output, options.static, options.exclude)
+
+if __name__ == '__main__':
+    main()
@@ -33,80 +33,279 @@
 import os
 import json
 import argparse
-import tempfile
-import shutil
+import decimal
+import functools
+import hashlib
+import multiprocessing
 import zipfile
 import logging
 
+try:
+    # Optional, lets large exports be parsed in constant memory
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
+
+# Errors raised by a data file which is not valid JSON
+JSON_ERRORS = (ValueError,) if ijson is None else (ValueError, ijson.JSONError)
+
 logger = logging.getLogger(__name__)
 
+# Prefixes of the builder and static configlet objects in the data file, as reported by ijson
+ITEM_PREFIXES = {
+    'data.configletBuilder.item': 'configletBuilder',
+    'data.configlet.item': 'configlet',
+}
+
 class ExtractFileException(Exception):
     pass
 
-def extract_file(fname, tmpDir):
+def open_data_file(zipf):
     '''
+    Open the configlet data file inside the export archive, it is read
+    straight from the archive without being extracted
     '''
-    fileName = None
-    try:
-        zipf = zipfile.ZipFile(fname, 'r')
-    except zipfile.BadZipfile:
-        raise
     for member in zipf.namelist():
         name = str(member)
         if name.startswith('configletDataFile'):
-            fileName = name
-            break
-    if not fileName:
-        raise ExtractFileException('No configlet data file contained')
-    zipf.extractall(tmpDir)
-    db = {}
-    fObject = open(os.path.join(tmpDir, fileName), 'r')
-    db = json.load(fObject)
-    fObject.close()
+            return zipf.open(member)
+    raise ExtractFileException('No configlet data file contained')
+
+
+def _number(value):
+    '''
+    ijson returns numbers as Decimal, convert them to what json.load returns
+    '''
+    if isinstance(value, decimal.Decimal):
+        if value == value.to_integral_value():
+            return int(value)
+        return float(value)
+    return value
+
+
+def _iter_items_ijson(fObject):
+    '''
+    Build each builder and static configlet object from the parser events,
+    only one object is held in memory at a time
+    '''
+    builder = None
+    for prefix, event, value in ijson.parse(fObject):
+        if builder is None:
+            if event == 'start_map' and prefix in ITEM_PREFIXES:
+                kind = ITEM_PREFIXES[prefix]
+                builder = ObjectBuilder()
+                builder.event(event, value)
+            continue
+        builder.event(event, _number(value) if event == 'number' else value)
+        if event == 'end_map' and prefix in ITEM_PREFIXES:
+            yield kind, builder.value
+            builder = None
+
+
+def iter_export(fname):
+    '''
+    Yield (kind, info) for every object in an export archive, kind is
+    'configletBuilder' or 'configlet'
+    '''
+    zipf = zipfile.ZipFile(fname, 'r')
+    try:
+        fObject = open_data_file(zipf)
+        if ijson is not None:
+            for item in _iter_items_ijson(fObject):
+                yield item
+        else:
+            db = json.load(fObject)
+            for kind in ('configletBuilder', 'configlet'):
+                for info in db['data'].get(kind, []):
+                    yield kind, info
+        fObject.close()
+    finally:
+        zipf.close()
+
+
+def extract_file(fname, tmpDir=None):
+    '''
+    Load the whole configlet data file of an export archive. tmpDir is no
+    longer used, the data file is read without extracting it
+    '''
+    db = {'data': {'configletBuilder': [], 'configlet': []}}
+    for kind, info in iter_export(fname):
+        db['data'][kind].append(info)
     return db
 
 
+def getMainScript(configletInfo):
+    '''
+    Main script of a configlet builder, older exports store it as a string
+    '''
+    if isinstance(configletInfo['main_script'], dict):
+        return configletInfo['main_script']['data']
+    return configletInfo['main_script']
+
+
 def getConfigletBuilderData(db):
     ''' 
     '''
     data = []
-    mainScript = ""
     for configletInfo in db['data']['configletBuilder']:
-        if isinstance(configletInfo['main_script'], dict):
-            mainScript = configletInfo['main_script']['data']
-        else:
-            mainScript = configletInfo['main_script']
-
         data.append(
             dict({
                 'name':configletInfo['name'],
-                'main':mainScript,
+                'main':getMainScript(configletInfo),
                 })
         )
     return data
 
 
-def parse_out_main(fname, tmpDir, force=True):
+def write_file(name, content, force):
     '''
+    Write a file, asking first if it exists and force is not set
+
+    Returns False if the user declined to overwrite it
     '''
-    data = extract_file(fname, tmpDir)
-    configlet_data = getConfigletBuilderData(data)
-    for configlet_info in configlet_data:
-        if not force and os.path.isfile(configlet_info['name']):
-            cont = raw_input("File \'{}\' exists. Overwrite? [y/n]: ".format(configlet_info['name']))
-            if not cont.lower() in ("y", "yes"):
+    if not force and os.path.isfile(name):
+        cont = raw_input("File \'{}\' exists. Overwrite? [y/n]: ".format(name))
+        if not cont.lower() in ("y", "yes"):
+            return False
+    if isinstance(content, unicode):
+        content = content.encode('utf-8')
+    with open(name, 'w+') as f:
+        f.write(content)
+    logging.info('Created file \'%s\'', name)
+    return True
+
+
+def parse_out(fname, force=True, builders=True, configlets=False, forms=False):
+    '''
+    Write out the main script of each builder, the config of each static
+    configlet and the form definition of each builder as <name>.form.json
+    '''
+    for kind, info in iter_export(fname):
+        files = []
+        if kind == 'configletBuilder':
+            if builders:
+                files.append((info['name'], getMainScript(info)))
+            if forms:
+                files.append((info['name'] + '.form.json',
+                              json.dumps(info.get('formList', []), indent=2, sort_keys=True)))
+        elif configlets:
+            files.append((info['name'], info['config']))
+        for name, content in files:
+            if not write_file(name, content, force):
                 return
-        with open(configlet_info['name'], 'w+') as f:
-            f.write(configlet_info['main'])
-        logging.info('Created file \'%s\'', configlet_info['name'])
     return
 
+
+def find_archives(paths):
+    '''
+    Expand a list of archives and directories into a sorted list of archives,
+    directories are searched recursively for .zip files
+    '''
+    archives = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                for filename in filenames:
+                    if filename.lower().endswith('.zip'):
+                        archives.add(os.path.join(dirpath, filename))
+        else:
+            archives.add(path)
+    return sorted(archives)
+
+
+def store_script(scriptDir, content):
+    '''
+    Store a script under its content hash, identical scripts are only written
+    once. Returns the hash
+    '''
+    if isinstance(content, unicode):
+        content = content.encode('utf-8')
+    digest = hashlib.sha1(content).hexdigest()
+    path = os.path.join(scriptDir, digest)
+    if not os.path.isfile(path):
+        # Written under a unique name and renamed, so workers storing the same
+        # script at the same time never see a partial file
+        tmpPath = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmpPath, 'wb') as f:
+            f.write(content)
+        os.rename(tmpPath, path)
+    return digest
+
+
+def scan_archive(fname, scriptDir, configlets=False):
+    '''
+    Store the builder scripts, and the static configlets if requested, of one
+    archive. Runs in a worker process
+
+    Returns (fname, [(name, hash), ...]), or (fname, None) if the archive
+    could not be read
+    '''
+    entries = []
+    try:
+        for kind, info in iter_export(fname):
+            if kind == 'configletBuilder':
+                entries.append((info['name'], store_script(scriptDir, getMainScript(info))))
+            elif configlets:
+                entries.append((info['name'], store_script(scriptDir, info['config'])))
+    except (zipfile.BadZipfile, ExtractFileException, IOError, OSError, KeyError) + JSON_ERRORS as e:
+        logger.warning('Skipping \'%s\': %s', fname, e)
+        return fname, None
+    return fname, entries
+
+
+def parse_batch(paths, outDir, configlets=False, jobs=None):
+    '''
+    Process many archives across a pool of processes. Scripts are stored once
+    per content hash in <outDir>/scripts and index.json in outDir maps
+    name -> hash -> list of archives it was found in
+    '''
+    archives = find_archives(paths)
+    scriptDir = os.path.join(outDir, 'scripts')
+    if not os.path.isdir(scriptDir):
+        os.makedirs(scriptDir)
+    index = {}
+    pool = multiprocessing.Pool(jobs)
+    try:
+        scan = functools.partial(scan_archive, scriptDir=scriptDir, configlets=configlets)
+        for fname, entries in pool.imap_unordered(scan, archives):
+            for name, digest in entries or []:
+                index.setdefault(name, {}).setdefault(digest, []).append(fname)
+            logging.info('Processed \'%s\'', fname)
+    finally:
+        pool.close()
+        pool.join()
+    for versions in index.values():
+        for sources in versions.values():
+            sources.sort()
+    with open(os.path.join(outDir, 'index.json'), 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    logging.info('Indexed %d archives, %d names, %d unique scripts', len(archives), len(index),
+                 len(set(digest for versions in index.values() for digest in versions)))
+    return index
+
+
+def parse_out_main(fname, tmpDir=None, force=True):
+    '''
+    '''
+    parse_out(fname, force)
+
 def parseArgs():
     '''
     '''
     parser = argparse.ArgumentParser(description='CVP Configlet Export Parser')
-    parser.add_argument('filename', help='Exported zip\'d CVP Configlet file')
+    parser.add_argument('filename', nargs='+',
+                        help='Exported zip\'d CVP Configlet file, several files or directories with --batch')
     parser.add_argument('--force', action='store_true', help='Force overwrite', default=False)
+    parser.add_argument('--configlets', action='store_true', default=False,
+                        help='Also write out the static configlets')
+    parser.add_argument('--forms', action='store_true', default=False,
+                        help='Also write out the form definition of each builder as <name>.form.json')
+    parser.add_argument('--batch', metavar='OUTDIR', default=None,
+                        help='Process all the given archives in parallel, storing each unique script once '
+                             'under OUTDIR/scripts with an index in OUTDIR/index.json')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Number of processes for --batch, defaults to the number of CPUs')
     parser.add_argument('--verbose', action='store_true', help='Enable verbose output', default=False)
     args = parser.parse_args()
     # return namespace object returned from parse_args.
@@ -115,17 +314,17 @@ def parseArgs():
 
 def main():
     options = parseArgs()
-    tmpDir = tempfile.mkdtemp()
     
     if options.verbose:
         logging.basicConfig(
             format=u'%(levelname)s: %(message)s',
             level=logging.INFO)
 
-    try:
-        parse_out_main(options.filename, tmpDir, options.force)
-    finally:
-        shutil.rmtree(tmpDir)
+    if options.batch:
+        parse_batch(options.filename, options.batch, options.configlets, options.jobs)
+        return
+    for fname in options.filename:
+        parse_out(fname, options.force, configlets=options.configlets, forms=options.forms)
 
 if __name__ == '__main__':
     main()
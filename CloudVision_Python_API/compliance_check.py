@@ -72,6 +72,7 @@ op.add_option( '-p', '--cvppassword', dest='cvppassword', action='store', help='
 op.add_option( '-e', '--email', dest='email', action='store', help='Sender address for email', type='string')
 op.add_option( '-r', '--recipient', dest='recipient', action='store', help='Recipient address for email', type='string')
 op.add_option( '-s', '--smtpserver', dest='smtpserver', action='store', help='IP address for SMTP server', type='string')
+op.add_option( '-t', '--container', dest='container', action='store', help='Check compliance per container starting from this container, ex. Tenant for the whole tree', type='string')
 
 opts, _ = op.parse_args()
 
@@ -81,22 +82,71 @@ password = opts.cvppassword
 email = opts.email
 recipient = opts.recipient
 smtpserver = opts.smtpserver
+containerName = opts.container
 
-server = cvp.Cvp( host )
-server.authenticate( user , password )
+#
+# Support functions for container level compliance checks
+#
 
-#container = server.getContainer(containerName)
-#events = server.containerComplianceCheck(container)
+def containerInCompliance( cvpServer , container ):
+	# A container is compliant when every event returned by the container
+	# compliance check reports DEVICE_IN_COMPLIANCE. Errors count as failures
+	# so the devices below get checked individually.
+	try:
+		events = cvpServer.containerComplianceCheck( container )
+	except cvp.cvpServices.CvpError:
+		return False
+	for event in events:
+		if event.complianceCode != DEVICE_IN_COMPLIANCE:
+			return False
+	return True
+
+def containerCompliance( cvpServer , container , children , devicesByContainer , results ):
+	# Check a whole subtree with one request. Only when it fails descend into
+	# the child containers and fall back to per device checks for the devices
+	# placed directly in the failing container.
+	if containerInCompliance( cvpServer , container ):
+		pending = [ container.name ]
+		while pending:
+			name = pending.pop()
+			for device in devicesByContainer.get( name , [] ):
+				results.append( ( device , DEVICE_IN_COMPLIANCE ) )
+			pending.extend( child.name for child in children.get( name , [] ) )
+		return
+	for device in devicesByContainer.get( container.name , [] ):
+		results.append( ( device , cvpServer.deviceComplianceCheck( device ) ) )
+	for child in children.get( container.name , [] ):
+		containerCompliance( cvpServer , child , children , devicesByContainer , results )
+
+def checkContainers( cvpServer , devices , rootName ):
+	children = {}
+	root = None
+	for container in cvpServer.getContainers():
+		children.setdefault( container.parentName , [] ).append( container )
+		if container.name == rootName:
+			root = container
+	if root is None:
+		raise ValueError( 'Container %s not found' % rootName )
+	devicesByContainer = {}
+	for device in devices:
+		devicesByContainer.setdefault( device.containerName , [] ).append( device )
+	results = []
+	containerCompliance( cvpServer , root , children , devicesByContainer , results )
+	return results
 
-#for event in events:
-#	print event.complianceCode
+server = cvp.Cvp( host )
+server.authenticate( user , password )
 
 devices = server.getDevices()
 nonCompliant = []
 body = ""
 
-for device in devices:
-	compliance = server.deviceComplianceCheck(device)
+if containerName:
+	results = checkContainers(server, devices, containerName)
+else:
+	results = [(device, server.deviceComplianceCheck(device)) for device in devices]
+
+for device, compliance in results:
 	if compliance != 0:
 		nonCompliantMessage = complianceCodes[compliance]
 		nonCompliantDevice = {	'device': device.fqdn,
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+'''
+
+   Load test for compliancecheck.py against the local CVP stand-in in fakecvp.py.
+
+   Runs getComplianceList() against synthetic networks of increasing size and reports, for each
+   size, the wall time, devices checked per second, the CVP calls made, the CVP errors the
+   checker handled and the peak memory of the process.  Example:
+
+   benchmark.py --devices 10,100,1000,10000 --latency 0.01 --unreachable 0.01 --noncompliant 0.02
+
+'''
+
+import argparse
+import resource
+import time
+
+import fakecvp
+fakecvp.install()
+
+import compliancecheck
+from compliancemetrics import Metrics
+from compliancestate import StateStore
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='compliancecheck.py load test')
+    parser.add_argument('--devices', default='10,100,1000,10000', help='Comma separated network sizes to run')
+    parser.add_argument('--latency', type=float, default=0.01, help='Seconds each CVP call takes')
+    parser.add_argument('--unreachable-delay', type=float, default=1.0,
+                        help='Seconds a reachability check of an unreachable device takes')
+    parser.add_argument('--errors', type=float, default=0.0, help='Fraction of CVP calls failing')
+    parser.add_argument('--unreachable', type=float, default=0.01, help='Fraction of devices unreachable')
+    parser.add_argument('--noncompliant', type=float, default=0.02, help='Fraction of devices out of compliance')
+    parser.add_argument('--container', default=None, help='Check per container from this container, e.g. Tenant')
+    parser.add_argument('--workers', type=int, default=compliancecheck.PROBE_WORKERS,
+                        help='Parallel reachability checks')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the synthetic network')
+    return parser.parse_args()
+
+
+def run(options, size):
+    server = fakecvp.FakeCvp(devices=size, latency=options.latency, unreachabledelay=options.unreachable_delay,
+                             errorrate=options.errors, unreachablerate=options.unreachable,
+                             noncompliantrate=options.noncompliant, seed=options.seed)
+    compliancecheck.server = server
+    compliancecheck.STATE = StateStore(':memory:')
+    compliancecheck.METRICS = Metrics()
+    compliancecheck.CONTAINER = options.container
+    compliancecheck.PROBE_WORKERS = options.workers
+
+    start = time.time()
+    try:
+        unreachable, outofcompliance = compliancecheck.getComplianceList()
+        unreachable, outofcompliance = str(len(unreachable)), str(len(outofcompliance))
+    except fakecvp.CvpError as e:
+        # Errors of a single device are handled by the checker, an error pulling the device or container
+        # list aborts the whole run
+        print 'Run aborted: %s' % e
+        unreachable = outofcompliance = 'aborted'
+    elapsed = time.time() - start
+    compliancecheck.STATE.close()
+
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    calls = sum(server.calls.values())
+    errors = sum(compliancecheck.METRICS.errors.values())
+    print '%8d %10.2f %12.1f %8s %8s %10d %8d %10.1f' % (size, elapsed, size / elapsed, unreachable,
+                                                         outofcompliance, calls, errors, peak)
+
+
+def main():
+    options = parseArgs()
+    print '%8s %10s %12s %8s %8s %10s %8s %10s' % ('devices', 'seconds', 'devices/s', 'unreach', 'noncomp',
+                                                   'cvp calls', 'errors', 'peak MB')
+    for size in options.devices.split(','):
+        run(options, int(size))
+
+
+if __name__ == '__main__':
+    main()
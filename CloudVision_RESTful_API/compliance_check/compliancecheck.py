@@ -39,7 +39,7 @@ __author__ = 'jkelly@arista.com'
 
    Description:
    Run every X interval
-   Call compliance check from root container
+   Call compliance check per device, or per container from the root or a chosen container
    Generate list of non-compliant systems
    If configured, email list
    If configured, iterate list and SYSLOG to configured server
@@ -63,13 +63,15 @@ __author__ = 'jkelly@arista.com'
 
 '''
 
+import atexit
 import getopt
 import json
 import logging
 from logging import handlers
-import smtplib
-from email.mime.text import MIMEText
+import Queue
+import signal
 import sys, time
+import threading
 
 try:
     from daemon import Daemon
@@ -82,6 +84,11 @@ import requests_2_4_0 as requests
 from requests_2_4_0 import packages
 import cvp
 
+from compliancemetrics import Metrics
+from compliancenotify import Notifier
+from compliancescheduler import PollScheduler
+from compliancestate import StateStore
+
 # Configuration settings, modify as needed.
 
 MIN_INTERVAL = 60  # This is the minimum recommended interval the script should run in seconds
@@ -94,17 +101,70 @@ EMAILTO = None  # Email To address, use quotes, mandatory if using email
 EMAILPASS = None  # Email password, mandatory if using gmail
 EMAILSERVER = None  # Email server, for gmail, 'smtp.gmail.com' mandatory if using mail
 EMAILPORT = 587  # Email server port, for gmail, 587 is default
+CONTAINER = None  # Container to check compliance from, use quotes, 'Tenant' is the root. None checks each device
+PROBE_WORKERS = 16  # Number of reachability checks to run in parallel
+PROBE_TIMEOUT = 5  # Seconds to wait for a single reachability check before treating the switch as unreachable
+STATEFILE = '/var/tmp/cvpcompliancecheck.db'  # Where the last known status of each switch is kept across restarts
+MAX_BACKOFF = 4  # Switches which stay in compliance back off to being checked every MAX_BACKOFF intervals
+NOTIFY_WINDOW = 60  # Seconds to collect alerts for before sending them as one digest
+NOTIFY_RATE = 10  # Maximum number of digests per hour for each of email and syslog, held back alerts go in the next one
+METRICSFILE = None  # File to write metrics to after each run, e.g. for the node_exporter textfile collector, use quotes
+METRICSPORT = None  # Port to serve metrics on at http://<host>:<port>/metrics, None disables the endpoint
+
+STATE = None
+NOTIFIER = None
+METRICS = Metrics()
+METRICSSERVER = None
+server = None
+
+# Compliance code returned by CVP for a device that is in compliance
+DEVICE_IN_COMPLIANCE = 0
+# Error code CVP returns for a request made with an expired or invalid session
+UNAUTHORIZED_USER = '112498'
+
+
+class SessionExpired(Exception):
+    """
+    Raised when CVP rejects a request because the session expired, the cycle is aborted and the next one
+    authenticates again
+    """
+    pass
+
+
+def isSessionError(error):
+    """
+    Function to tell whether a CvpError means the session is no longer valid
+
+    :param error: CvpError raised by cvpServices, its message starts with the error code
 
-CURSTATUS = {}
+    :return:
+    expired - whether or not CVP rejected the session
+    """
+    return str(error).startswith(UNAUTHORIZED_USER) or 'Unauthorized User' in str(error)
+
+def terminate(signum, frame):
+    # Exit through sys.exit so the atexit handlers send the queued alerts, Daemon.stop keeps sending
+    # SIGTERM until the process is gone so ignore the repeats
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    sys.exit(0)
 
-assert CVPSERVER is not None
-assert SYSLOGSERVER is not None
 
 class MyDaemon(Daemon):
     def run(self):
+        signal.signal(signal.SIGTERM, terminate)
+        # Container checks cover the whole tree at once, so they keep running every interval
+        if CONTAINER is not None:
+            while True:
+                main()
+                time.sleep(INTERVAL)
+        # Otherwise each switch is checked on its own schedule, switches which changed or are failing are
+        # checked every MIN_INTERVAL (or a quarter of the interval if that is longer, but never less often
+        # than every interval), stable switches back off
+        scheduler = PollScheduler(INTERVAL, min(INTERVAL, max(MIN_INTERVAL, INTERVAL / 4)),
+                                  INTERVAL * MAX_BACKOFF)
         while True:
-            main()
-            time.sleep(INTERVAL)
+            main(scheduler)
+            time.sleep(max(1, scheduler.nextdue() - time.time()))
 
 class Switch(object):
     """
@@ -115,6 +175,7 @@ class Switch(object):
     self.macaddress - mac address of the switch - used by cvp to identify and execute certain tasks
     self.reachable - is the switch reachable, determined by cvp ip reachability check?
     self.compliant - is the switch configuration synchronized with CVP's view of the configuration?
+    self.compliancecode - compliance code returned by cvp, None if the switch was not checked
     self.fqdn - not currently used, theoretically to provide fqdn of switch
     self.status - status code, 0, 1, or 2 to determine whether the switch is unreachable, out of compliance,
     or in compliance
@@ -129,6 +190,7 @@ class Switch(object):
         self.macaddress = None
         self.reachable = None
         self.compliant = None
+        self.compliancecode = None
         self.fqdn = None
         self.status = None
 
@@ -142,52 +204,72 @@ class Switch(object):
                 self.status = 1
         return self.status
 
-switchstatus = Switch()
-
-
-def getComplianceList():
+def getComplianceList(scheduler=None):
 
     """
     Function to generate lists of which switches are reachable, and which are out of compliance
 
+    :param scheduler: PollScheduler, if given only the switches due are checked and then rescheduled,
+    otherwise every switch is checked.  Switches whose check failed or was aborted are retried with backoff
+
     :return:
       unreachable - list of unreachable devices
       outofcompliance - list of devices out of config compliance
     """
-    global CURSTATUS
+    global STATE
     unreachable = []
     outofcompliance = []
-    # Pull the list of devices from CVP
-    devicelist = getDeviceLists()
-    # iterate through list, check if device is reachable first, then if so, check compliance
-    for device in devicelist:
+    now = time.time()
+    # check per container if configured, otherwise check if each device is reachable first, then if so,
+    # check compliance
+    if CONTAINER is not None:
+        devicelist = getDeviceLists()
+        METRICS.retain(devicelist)
+        switches = checkContainers(devicelist, CONTAINER)
+    elif scheduler is not None:
+        # Pull the list of devices from CVP once per interval
+        if scheduler.needsrefresh(now):
+            scheduler.sync(getDeviceLists(), now)
+            METRICS.retain(scheduler.devices)
+        due = scheduler.due(now)
         try:
-            switchstatus.reachable = checkDeviceStatus(devicelist[device])
-            switchstatus.ipaddress = devicelist[device]
-            if switchstatus.reachable is True:
-                switchstatus.compliant = server.deviceComplianceCheck(device)
+            switches = checkSwitches(due)
         except:
+            # The cycle was aborted, nothing is recorded and the switches are checked again later
+            for device in due:
+                scheduler.retry(device.macAddress, now)
             raise
-        # get the status code and create lists for unreachables and out of compliance switches
-        status = switchstatus.makestatus()
-        try:
-            if status == CURSTATUS[switchstatus.ipaddress]:
-                continue
-
-        except KeyError:
-            CURSTATUS[switchstatus.ipaddress] = status
-        except:
-            raise
-
-        if status == 0:
+    else:
+        devicelist = getDeviceLists()
+        METRICS.retain(devicelist)
+        switches = checkSwitches(devicelist.values())
+    # get the status codes, only switches whose status changed since the last check are reported
+    for switchstatus in switches:
+        switchstatus.makestatus()
+    if STATE is None:
+        STATE = StateStore(STATEFILE)
+    for switchstatus in switches:
+        METRICS.device(switchstatus)
+    changed = set()
+    for switchstatus, previous in STATE.record(switches, now):
+        changed.add(switchstatus.macaddress)
+        # create lists for unreachables and out of compliance switches
+        if switchstatus.status == 0:
             unreachable.append(switchstatus.ipaddress)
-        elif status == 1:
+        elif switchstatus.status == 1:
             outofcompliance.append(switchstatus.ipaddress)
-        CURSTATUS[switchstatus.ipaddress] = status
 
+    if scheduler is not None:
+        for switchstatus in switches:
+            scheduler.reschedule(switchstatus.macaddress,
+                                 switchstatus.macaddress in changed or switchstatus.status != 2, now)
+        # Switches whose compliance check failed were left out, check them again after a backoff
+        checked = set(switchstatus.macaddress for switchstatus in switches)
+        for device in due:
+            if device.macAddress not in checked:
+                scheduler.retry(device.macAddress, now)
 
-
-    return unreachable, outofcompliance  #, CURSTATUS
+    return unreachable, outofcompliance
 
 
 def getDeviceLists():
@@ -195,68 +277,249 @@ def getDeviceLists():
     Function to pull list of devices from CVP
 
     Returns:
-    devices - dictionary of devices as kv pair mac_address: ip_address
+    devices - dictionary of devices as kv pair mac_address: device
     """
 
     devices = {}
     devicelist = server.getDevices()
     for device in devicelist:
-        devices[device.macAddress] = device.ipAddress
+        devices[device.macAddress] = device
     return devices
 
 
-def checkDeviceStatus(device):
+def makeSwitch(device):
+    """
+    Function to create a Switch object for a cvp device
+
+    :param device: cvp device object
+
+    :return:
+    switch - Switch object with the device addresses filled in
+    """
+    switch = Switch()
+    switch.ipaddress = device.ipAddress
+    switch.macaddress = device.macAddress
+    switch.fqdn = device.fqdn
+    return switch
+
+
+def probeDevices(devices):
+    """
+    Generator to check reachability of many switches in parallel, runs up to PROBE_WORKERS
+    checkDeviceStatus calls at a time and yields each result as soon as it is available.  The first error stops
+    the remaining checks and is raised once every worker has finished
+
+    :param devices: list of cvp device objects
+
+    :return:
+    yields (device, reachable) tuples in completion order
+    """
+    pending = Queue.Queue()
+    results = Queue.Queue()
+    stop = threading.Event()
+    for device in devices:
+        pending.put(device)
+
+    def worker():
+        # Each worker sends its requests over its own requests session, the shared cvpService is only read
+        # for the CVP url and the session cookies
+        session = requests.Session()
+        try:
+            while not stop.is_set():
+                try:
+                    device = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    results.put((device, checkDeviceStatus(device.ipAddress, session), None))
+                except Exception as e:
+                    # CVP is failing, stop the other workers from sending it more requests
+                    stop.set()
+                    results.put((device, False, e))
+        finally:
+            session.close()
+
+    workers = []
+    for _ in range(min(PROBE_WORKERS, len(devices))):
+        probe = threading.Thread(target=worker)
+        probe.daemon = True
+        probe.start()
+        workers.append(probe)
+
+    try:
+        for _ in range(len(devices)):
+            device, reachable, error = results.get()
+            if error is not None:
+                raise error
+            yield device, reachable
+    finally:
+        # Reached on an error and when the caller stops early, no probe outlives the cycle
+        stop.set()
+        for probe in workers:
+            probe.join()
+
+
+def checkSwitches(devices):
+    """
+    Function to check reachability of the switches in parallel, and the compliance of each reachable switch
+    as its reachability result comes in
+
+    :param devices: list of cvp device objects
+
+    :return:
+    switches - list of Switch objects with the reachability and compliance results, switches whose compliance
+    check failed are left out
+    """
+    switches = []
+    for device, reachable in probeDevices(devices):
+        switch = makeSwitch(device)
+        switch.reachable = reachable
+        if switch.reachable is True:
+            try:
+                switch.compliancecode = checkDeviceCompliance(device)
+            except cvp.cvpServices.CvpError as e:
+                if isSessionError(e):
+                    raise SessionExpired(str(e))
+                # Leave the switch out of this run, its last known status is kept and it is checked again
+                # on the next run
+                print "Compliance check of %s failed %s" % (device.ipAddress, e)
+                continue
+            switch.compliant = switch.compliancecode == DEVICE_IN_COMPLIANCE
+        switches.append(switch)
+    return switches
+
+
+def checkDeviceCompliance(device):
+    """
+    Function to run the cvp compliance check of a single switch, recording its latency and errors
+
+    :param device: cvp device object
+
+    :return:
+    compliancecode - compliance code returned by cvp
+    """
+    start = time.time()
+    try:
+        return server.deviceComplianceCheck(device)
+    except cvp.cvpServices.CvpError:
+        METRICS.error('deviceComplianceCheck')
+        raise
+    finally:
+        METRICS.observe('compliance', time.time() - start)
+
+
+def containerInCompliance(container):
+    """
+    Function to run one compliance check for every device below a container
+
+    :param container: cvp container object
+
+    :return:
+    compliant - True if every event of the container compliance check is in compliance
+    """
+    try:
+        events = server.containerComplianceCheck(container)
+    except cvp.cvpServices.CvpError as e:
+        if isSessionError(e):
+            raise SessionExpired(str(e))
+        METRICS.error('containerComplianceCheck')
+        print "Container compliance check of %s failed, checking devices individually %s" % (container.name, e)
+        return False
+    for event in events:
+        if event.complianceCode != DEVICE_IN_COMPLIANCE:
+            return False
+    return True
+
+
+def checkContainers(devicelist, containername):
+    """
+    Function to check compliance per container, starting at containername.  A subtree that passes
+    is resolved with a single request, only failing containers are descended into and their devices
+    checked individually.
+
+    :param devicelist: dictionary of devices as returned by getDeviceLists
+    :param containername: name of the container to start from, 'Tenant' for the root container
+
+    :return:
+    switches - list of Switch objects, one per device below containername
+    """
+    children = {}
+    root = None
+    for container in server.getContainers():
+        children.setdefault(container.parentName, []).append(container)
+        if container.name == containername:
+            root = container
+    if root is None:
+        raise ValueError("Container %s not found in CVP" % containername)
+    devicesbycontainer = {}
+    for device in devicelist.values():
+        devicesbycontainer.setdefault(device.containerName, []).append(device)
+
+    switches = []
+    failed = []
+    pending = [root]
+    while pending:
+        container = pending.pop()
+        if containerInCompliance(container):
+            # Fan the result out to every device in the subtree
+            subtree = [container]
+            while subtree:
+                current = subtree.pop()
+                for device in devicesbycontainer.get(current.name, []):
+                    switch = makeSwitch(device)
+                    switch.reachable = True
+                    switch.compliant = True
+                    switch.compliancecode = DEVICE_IN_COMPLIANCE
+                    switches.append(switch)
+                subtree.extend(children.get(current.name, []))
+        else:
+            failed.extend(devicesbycontainer.get(container.name, []))
+            pending.extend(children.get(container.name, []))
+    # Devices in failing containers are checked individually in one parallel pass
+    switches.extend(checkSwitches(failed))
+    return switches
+
+
+def checkDeviceStatus(device, session=None):
     """
     Function to check reachability of a switch, calls cvp ipConnectivityTest
 
     :param device: device ip address, used by cvp api to check reachability
+    :param session: requests session to send the request over, a new connection is made if None
 
     :return:
     reachable - whether or not the switch is reachable
     """
     data = {"ipAddress": device}
+    post = requests.post if session is None else session.post
+    start = time.time()
     try:
         #print server.cvpService.url, data
-        pingstatus = server.cvpService.doRequest( requests.post, '%s/web/provisioning/ipConnectivityTest.do' % server.cvpService.url, data=json.dumps(data), cookies=server.cvpService.cookies)
+        pingstatus = server.cvpService.doRequest( post, '%s/web/provisioning/ipConnectivityTest.do' % server.cvpService.url, data=json.dumps(data), cookies=server.cvpService.cookies, timeout=PROBE_TIMEOUT)
         if pingstatus['data'] == 'success':
             reachable = True
         else:
             reachable = False
+    except requests.exceptions.ConnectionError:
+        # CVP itself can't be reached, this says nothing about the switch.  Abort the cycle rather than
+        # reporting every switch as unreachable.
+        raise
+    except requests.exceptions.Timeout:
+        # CVP did not answer within PROBE_TIMEOUT, the switch did not respond to its ping
+        reachable = False
     except cvp.cvpServices.CvpError as e:
+        if isSessionError(e):
+            # Not a verdict on the switch, abort the cycle and log in again
+            raise SessionExpired(str(e))
         if str(e).startswith('122605'):
             reachable = False
         else:
             reachable = False
+            METRICS.error('ipConnectivityTest')
             print "An error occurred %s" % e
+    METRICS.observe('reachability', time.time() - start)
     return reachable
 
-def sendMail(switchlist, text):
-    """
-    Function to email a list of unreachable or out of compliance switches to a given email address
-    The way this is written will work with gmail.  If using two factor authentication, you need to
-    create a new app specific password in gmail
-
-    :param switchlist: list of switches which are either unreachable or out of compliance
-    :param text: beginning of the report, identifies whether or not report lists unreachable or out of comp.
-    """
-    body = text + "\n"
-    for switch in switchlist:
-        body += switch + "\n"
-    msg = MIMEText(body)
-    msg['Subject'] = text
-    msg['From'] = EMAILFROM
-    msg['To'] = EMAILTO
-    msg = msg.as_string()
-    try:
-        emailserver = smtplib.SMTP(EMAILSERVER, EMAILPORT)
-        emailserver.starttls()
-        emailserver.login(EMAILFROM, EMAILPASS)
-        emailserver.sendmail(EMAILFROM, EMAILTO, msg)
-        emailserver.quit()
-    except:
-        raise
-
-
 def sendSyslog(switchlist, text):
     """
     Function to send a syslog message for each unreachable and out of compliance switch
@@ -295,7 +558,8 @@ def printer(switchlist, text):
 
 def notify(switchlist, text, EMAIL, SYSLOG, PRINT):
     """
-    Function to determine where results are sent
+    Function to determine where results are sent.  Printing happens right away, email and syslog messages are
+    queued to the notifier thread which sends them as rate limited digests over persistent connections.
 
     :param switchlist: list of switches which are either unreachable or out of compliance
     :param text: Initial text of message, indicates type of message
@@ -305,16 +569,25 @@ def notify(switchlist, text, EMAIL, SYSLOG, PRINT):
 
     """
 
+    global NOTIFIER
     if PRINT is True:
-        printer(switchlist, text)
-    if EMAIL is True:
-        sendMail(switchlist, text)
-    if SYSLOG is True:
-        sendSyslog(switchlist, text)
+        printer(switchlist, "%s %s" % (time.asctime(), text))
+    if EMAIL is True or SYSLOG is True:
+        # Start the notifier on first use, so it runs in the daemonized process
+        if NOTIFIER is None:
+            email = None
+            if EMAIL is True:
+                email = {'server': EMAILSERVER, 'port': EMAILPORT, 'sender': EMAILFROM, 'password': EMAILPASS,
+                         'recipient': EMAILTO}
+            NOTIFIER = Notifier(NOTIFY_WINDOW, NOTIFY_RATE, email, SYSLOGSERVER if SYSLOG is True else None)
+            NOTIFIER.start()
+            # Send the alerts still collected on exit, waiting at most one window
+            atexit.register(NOTIFIER.stop, NOTIFY_WINDOW)
+        NOTIFIER.alert(switchlist, text)
 
 
 def usage():
-    print "usage:compliancecheck.py (start|stop|restart) -i <interval seconds> -u <cvp username> -p <cvp password> --mail --syslog --print"
+    print "usage:compliancecheck.py (start|stop|restart) -i <interval seconds> -u <cvp username> -p <cvp password> --mail --syslog --print --container <container name>"
 
 
 def getargs(argv):
@@ -330,7 +603,7 @@ def getargs(argv):
     SYSLOG - Send syslong or not, boolean, default to false from global config
     PRINT - Print locally or not, boolean, default to false from global config
     """
-    global MIN_INTERVAL  #, EMAIL, CVPUSER, CVPPASS, SYSLOG, PRINT, INTERVAL, RUN
+    global MIN_INTERVAL, CONTAINER  #, EMAIL, CVPUSER, CVPPASS, SYSLOG, PRINT, INTERVAL, RUN
     INTERVAL = 3600  # How frequently to call script
     CVPUSER = None
     CVPPASS = None
@@ -343,7 +616,7 @@ def getargs(argv):
 
     if not len(argv) == 1:
         try:
-            opts, args = getopt.getopt(argv, "hi:u:p:", ["mail", "syslog", "print", "daemonize", "run"])
+            opts, args = getopt.getopt(argv, "hi:u:p:", ["mail", "syslog", "print", "daemonize", "run", "container="])
         except getopt.GetoptError:
             usage()
             sys.exit(2)
@@ -373,6 +646,8 @@ def getargs(argv):
                 SYSLOG = True
             elif opt == "--print":
                 PRINT = True
+            elif opt == "--container":
+                CONTAINER = arg
             else:
                 usage()
                 sys.exit(2)
@@ -383,44 +658,83 @@ def getargs(argv):
     return INTERVAL, CVPUSER, CVPPASS, EMAIL, SYSLOG, PRINT
 
 
-def main():
-    if SYSLOG is True:
-        assert SYSLOGSERVER is not None
-    if EMAIL is True:
-        assert EMAILFROM is not None
-        assert EMAILTO is not None
-        assert EMAILPASS is not None
-        assert EMAILSERVER is not None
+def connect():
+    """
+    Function to authenticate to CVP.  The session is kept for the lifetime of the process and only
+    re-established after an error from CVP has reset it.
+
+    :return:
+    connected - whether or not there is an authenticated session to CVP
+    """
+    global server
+    if server is not None:
+        return True
     try:
-        global server
-        server = cvp.Cvp(CVPSERVER)
-        server.authenticate(CVPUSER, CVPPASS)
+        cvpserver = cvp.Cvp(CVPSERVER)
+        cvpserver.authenticate(CVPUSER, CVPPASS)
     except requests.HTTPError as e:
+        METRICS.error('authenticate')
         print "Error connecting to CVP Server, trying again in 60 seconds: %s" % str(e)
         time.sleep(60)
+        return False
     except packages.urllib3.exceptions.ProtocolError as e:
         if str(e) == "('Connection aborted.', gaierror(8, 'nodename nor servname provided, or not known'))":
             print "DNS Error: The CVP Server %s can not be found" % CVPSERVER
             sys.exit(2)
         elif str(e) == "('Connection aborted.', error(54, 'Connection reset by peer'))":
             print "Error, connection aborted"
+            return False
         else:
             raise
     except:
         raise
+    server = cvpserver
+    return True
+
+
+def main(scheduler=None):
+    global server, METRICSSERVER
+    if SYSLOG is True:
+        assert SYSLOGSERVER is not None
+    if EMAIL is True:
+        assert EMAILFROM is not None
+        assert EMAILTO is not None
+        assert EMAILPASS is not None
+        assert EMAILSERVER is not None
+    # Start the metrics endpoint on first use, so it runs in the daemonized process
+    if METRICSPORT is not None and METRICSSERVER is None:
+        METRICSSERVER = METRICS.serve(METRICSPORT)
+    if not connect():
+        return
+    start = time.time()
     try:
-        unreachable, outofcompliance = getComplianceList()
+        unreachable, outofcompliance = getComplianceList(scheduler)
         # If there are any unreachable switches, send the list to the notify function for reporting
         if len(unreachable) > 0:
-            text = "%s CVP_Compliance_Checker: UNREACHABLE: " % time.asctime()
+            text = "CVP_Compliance_Checker: UNREACHABLE: "
             notify(unreachable, text, EMAIL, SYSLOG, PRINT)
         # If there are switches out of compliance, send the list to notify function for reporting
         if len(outofcompliance) > 0:
-            text = "%s CVP_Compliance_Checker: OUT_OF_COMPLIANCE: " % time.asctime()
+            text = "CVP_Compliance_Checker: OUT_OF_COMPLIANCE: "
             notify(outofcompliance, text, EMAIL, SYSLOG, PRINT)
     # If CVP can't be reached, try again in 1 minute, could probably use a counter to abort after x tries
+    except requests.exceptions.ConnectionError as e:
+        print "Error connecting to CVP server, trying again in 60 seconds %s" % str(e)
+        METRICS.error('connection')
+        server = None
+        time.sleep(60)
+    except (SessionExpired, cvp.cvpServices.CvpError) as e:
+        if not isinstance(e, SessionExpired) and not isSessionError(e):
+            raise
+        # Abort the cycle without recording or reporting anything, the next run logs in again
+        print "CVP session expired, authenticating again on the next run %s" % str(e)
+        METRICS.error('session')
+        server = None
     except requests.HTTPError as e:
         print "Error reaching CVP server, trying again in 60 seconds %s" % str(e)
+        METRICS.error('session')
+        # The session may have expired, authenticate again on the next run
+        server = None
         time.sleep(60)
         #continue
     except packages.urllib3.exceptions.ProtocolError as e:
@@ -431,12 +745,17 @@ def main():
             raise
     except:
         raise
+    METRICS.cycle(time.time() - start)
+    if METRICSFILE is not None:
+        METRICS.writeTextfile(METRICSFILE)
     print "#"*120
     print "Executing Compliance Check @ ", time.asctime()
     print "#"*120
 
 
 if __name__ == "__main__":
+        assert CVPSERVER is not None
+        assert SYSLOGSERVER is not None
         daemon = MyDaemon('/tmp/cvpcompliancecheck.pid')
         INTERVAL, CVPUSER, CVPPASS, EMAIL, SYSLOG, PRINT = getargs(sys.argv[2:])
         daemon.INTERVAL = INTERVAL
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+'''
+
+   Metrics for compliancecheck.py in the Prometheus text format.
+
+   The metrics can be written to a file for the node_exporter textfile collector, served over
+   HTTP, or both.  Reported metrics:
+
+   cvp_compliance_devices{status}                    number of switches per status
+   cvp_compliance_device_code{mac,ip}                last compliance code of each switch, -1 if unreachable
+   cvp_compliance_check_latency_seconds{check}       histogram of reachability and compliance check latency
+   cvp_compliance_api_errors_total{call}             errors returned by the CVP API per call
+   cvp_compliance_cycle_duration_seconds             duration of the last check cycle
+   cvp_compliance_cycles_total                       number of check cycles run
+
+'''
+
+import BaseHTTPServer
+import os
+import threading
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Names used for the status codes returned by Switch.makestatus
+STATUS_NAMES = {0: 'unreachable', 1: 'out_of_compliance', 2: 'in_compliance'}
+
+
+class Metrics(object):
+    """
+    Thread safe collection of compliance checker metrics
+
+    Functions:
+    device - record the result of a switch check
+    retain - drop switches which are no longer in CVP
+    observe - record the latency of a check
+    error - count an error returned by the CVP API
+    cycle - record the duration of a check cycle
+    render - returns the metrics in the Prometheus text format
+    writeTextfile - atomically write the metrics to a file
+    serve - serve the metrics over HTTP from a background thread
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.devices = {}
+        self.latency = {}
+        self.errors = {}
+        self.cycleduration = 0.0
+        self.cycles = 0
+
+    def device(self, switch):
+        """
+        Function to record the result of a switch check
+
+        :param switch: Switch object, makestatus must have been called
+        """
+        code = switch.compliancecode if switch.compliancecode is not None else -1
+        with self.lock:
+            self.devices[switch.macaddress] = (switch.ipaddress, switch.status, code)
+
+    def retain(self, macs):
+        """
+        Function to drop the switches which are not in the given list of mac addresses
+        """
+        with self.lock:
+            for mac in self.devices.keys():
+                if mac not in macs:
+                    del self.devices[mac]
+
+    def observe(self, check, seconds):
+        with self.lock:
+            counts, total = self.latency.get(check, ([0] * (len(LATENCY_BUCKETS) + 1), 0.0))
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self.latency[check] = (counts, total + seconds)
+
+    def error(self, call):
+        with self.lock:
+            self.errors[call] = self.errors.get(call, 0) + 1
+
+    def cycle(self, seconds):
+        with self.lock:
+            self.cycleduration = seconds
+            self.cycles += 1
+
+    def render(self):
+        with self.lock:
+            lines = []
+            lines.append('# HELP cvp_compliance_devices Number of switches per status')
+            lines.append('# TYPE cvp_compliance_devices gauge')
+            counts = dict((name, 0) for name in STATUS_NAMES.values())
+            for ip, status, code in self.devices.values():
+                counts[STATUS_NAMES[status]] += 1
+            for name in sorted(counts):
+                lines.append('cvp_compliance_devices{status="%s"} %d' % (name, counts[name]))
+
+            lines.append('# HELP cvp_compliance_device_code Last compliance code of each switch, -1 if unreachable')
+            lines.append('# TYPE cvp_compliance_device_code gauge')
+            for mac in sorted(self.devices):
+                ip, status, code = self.devices[mac]
+                lines.append('cvp_compliance_device_code{mac="%s",ip="%s"} %d' % (mac, ip, code))
+
+            lines.append('# HELP cvp_compliance_check_latency_seconds Latency of reachability and compliance checks')
+            lines.append('# TYPE cvp_compliance_check_latency_seconds histogram')
+            for check in sorted(self.latency):
+                counts, total = self.latency[check]
+                for bound, count in zip(LATENCY_BUCKETS, counts):
+                    lines.append('cvp_compliance_check_latency_seconds_bucket{check="%s",le="%s"} %d'
+                                 % (check, bound, count))
+                lines.append('cvp_compliance_check_latency_seconds_bucket{check="%s",le="+Inf"} %d'
+                             % (check, counts[-1]))
+                lines.append('cvp_compliance_check_latency_seconds_sum{check="%s"} %f' % (check, total))
+                lines.append('cvp_compliance_check_latency_seconds_count{check="%s"} %d' % (check, counts[-1]))
+
+            lines.append('# HELP cvp_compliance_api_errors_total Errors returned by the CVP API')
+            lines.append('# TYPE cvp_compliance_api_errors_total counter')
+            for call in sorted(self.errors):
+                lines.append('cvp_compliance_api_errors_total{call="%s"} %d' % (call, self.errors[call]))
+
+            lines.append('# HELP cvp_compliance_cycle_duration_seconds Duration of the last check cycle')
+            lines.append('# TYPE cvp_compliance_cycle_duration_seconds gauge')
+            lines.append('cvp_compliance_cycle_duration_seconds %f' % self.cycleduration)
+            lines.append('# HELP cvp_compliance_cycles_total Number of check cycles run')
+            lines.append('# TYPE cvp_compliance_cycles_total counter')
+            lines.append('cvp_compliance_cycles_total %d' % self.cycles)
+        return '\n'.join(lines) + '\n'
+
+    def writeTextfile(self, path):
+        """
+        Function to write the metrics to a file, written to a temporary file first and renamed so a
+        collector never reads a partial file
+        """
+        tmppath = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmppath, 'w') as f:
+            f.write(self.render())
+        os.rename(tmppath, path)
+
+    def serve(self, port, address=''):
+        """
+        Function to serve the metrics on http://<address>:<port>/metrics from a background thread
+
+        :return:
+        server - the HTTP server, call shutdown() to stop it
+        """
+        metrics = self
+
+        class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = BaseHTTPServer.HTTPServer((address, port), MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
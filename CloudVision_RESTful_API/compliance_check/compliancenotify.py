@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+'''
+
+   Notification pipeline for compliancecheck.py.
+
+   Alerts are queued and sent from a background thread so a slow mail or syslog server never
+   delays the compliance checks.  Alerts arriving within a window are coalesced into a single
+   digest, the SMTP connection and syslog handler are kept open between digests, and each
+   channel is limited to a maximum number of digests per hour.  Alerts held back by the rate
+   limit are not dropped, they are merged into the next digest.  On stop the remaining alerts
+   are sent, those that still can't be sent are printed.
+
+'''
+
+import collections
+import logging
+from logging import handlers
+import Queue
+import smtplib
+import socket
+import sys
+from email.mime.text import MIMEText
+import threading
+import time
+
+# Maximum length of a single syslog message, longer digests are split over several messages
+SYSLOG_MAX = 900
+
+
+class Notifier(threading.Thread):
+    """
+    Background thread collecting alerts into digests and sending them by email and/or syslog
+
+    Variables:
+    self.window - seconds to collect alerts for before sending a digest
+    self.maxperhour - maximum number of digests sent per hour on each channel
+    self.email - email settings as a dict with keys server, port, sender, password and recipient, None disables email
+    self.syslogserver - syslog server address, a path or (host, port) tuple, None disables syslog
+
+    Functions:
+    alert - queue a list of switches for the next digest, returns immediately
+    stop - send the remaining alerts and stop the thread
+    """
+
+    def __init__(self, window, maxperhour, email=None, syslogserver=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.window = window
+        self.maxperhour = maxperhour
+        self.email = email
+        self.syslogserver = syslogserver
+        self.queue = Queue.Queue()
+        self.channels = {}
+        if email is not None:
+            self.channels['email'] = self._sendMail
+        if syslogserver is not None:
+            self.channels['syslog'] = self._sendSyslog
+        self.pending = dict((channel, collections.OrderedDict()) for channel in self.channels)
+        self.sent = dict((channel, collections.deque()) for channel in self.channels)
+        self.smtp = None
+        self.logger = None
+        self.stopping = False
+
+    def alert(self, switchlist, text):
+        """
+        Function to queue an alert
+
+        :param switchlist: list of switches which are either unreachable or out of compliance
+        :param text: type of the alert, switches with the same text are listed together in the digest
+        """
+        self.queue.put((text, list(switchlist)))
+
+    def stop(self, timeout=None):
+        """
+        Function to send the alerts still queued or pending and stop the thread.  Alerts which can't be sent,
+        because of the rate limit or a failing server, are printed so they are not lost silently
+
+        :param timeout: seconds to wait for the thread to finish, None to wait as long as it takes
+        """
+        if self.is_alive():
+            self.queue.put(None)
+            self.join(timeout)
+        else:
+            self._drain()
+
+    def run(self):
+        while not self.stopping:
+            # Wait for the first alert, then keep collecting until the window closes.  If alerts are
+            # held back by the rate limit only wait one window before trying to send them again.
+            try:
+                if any(self.pending.values()):
+                    self._collect(self.queue.get(timeout=self.window))
+                else:
+                    self._collect(self.queue.get())
+            except Queue.Empty:
+                pass
+            closes = time.time() + self.window
+            while not self.stopping:
+                remaining = closes - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    self._collect(self.queue.get(timeout=remaining))
+                except Queue.Empty:
+                    break
+            self._flush()
+        self._drain()
+
+    def _collect(self, item):
+        if item is None:
+            self.stopping = True
+            return
+        text, switchlist = item
+        for pending in self.pending.values():
+            # Ordered set of the switches, in the order they were first alerted
+            switches = pending.setdefault(text, collections.OrderedDict())
+            for switch in switchlist:
+                switches[switch] = None
+
+    def _drain(self):
+        # Send what is left, ignoring the window, and print what can't be sent
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except Queue.Empty:
+                break
+            if item is not None:
+                self._collect(item)
+        self._flush()
+        for channel in self.channels:
+            for text, switches in self.pending[channel].items():
+                print "Compliance alert not sent by %s: %s%s" % (channel, text, " ".join(switches))
+            self.pending[channel] = collections.OrderedDict()
+        self._smtpClose()
+
+    def _allowed(self, channel, now):
+        sent = self.sent[channel]
+        while sent and now - sent[0] >= 3600:
+            sent.popleft()
+        return len(sent) < self.maxperhour
+
+    def _flush(self):
+        now = time.time()
+        for channel, send in self.channels.items():
+            # A rate limited channel, or one that failed to send, keeps its alerts for the next digest
+            if self.pending[channel] and self._allowed(channel, now):
+                if send(self.pending[channel].items()):
+                    self.sent[channel].append(now)
+                    self.pending[channel] = collections.OrderedDict()
+
+    def _smtpConnect(self):
+        smtp = smtplib.SMTP(self.email['server'], self.email['port'])
+        smtp.starttls()
+        smtp.login(self.email['sender'], self.email['password'])
+        return smtp
+
+    def _sendMail(self, digest):
+        body = ""
+        for text, switchlist in digest:
+            body += text + "\n"
+            for switch in switchlist:
+                body += switch + "\n"
+            body += "\n"
+        msg = MIMEText(body)
+        msg['Subject'] = "%s %s" % (time.asctime(), ", ".join(
+            "%s%s" % (text, len(switchlist)) for text, switchlist in digest))
+        msg['From'] = self.email['sender']
+        msg['To'] = self.email['recipient']
+        msg = msg.as_string()
+        # Reuse the open connection, the server may have dropped it in the meantime so reconnect once
+        for attempt in range(2):
+            try:
+                if self.smtp is None:
+                    self.smtp = self._smtpConnect()
+                self.smtp.sendmail(self.email['sender'], self.email['recipient'], msg)
+                return True
+            except (smtplib.SMTPException, socket.error) as e:
+                self._smtpClose()
+                if attempt:
+                    print "Error sending compliance email, retrying with the next digest: %s" % e
+        return False
+
+    def _smtpClose(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, socket.error):
+                pass
+            self.smtp = None
+
+    def _sendSyslog(self, digest):
+        if self.logger is None:
+            try:
+                syslog = handlers.SysLogHandler(address=self.syslogserver)
+            except socket.error as e:
+                print "Error connecting to syslog server, retrying with the next digest: %s" % e
+                return False
+            self.logger = logging.getLogger('CvpNotifier')
+            self.logger.setLevel(logging.WARNING)
+            self.logger.propagate = False
+            self.logger.addHandler(syslog)
+            # Echo the messages to the terminal as well
+            self.logger.addHandler(logging.StreamHandler(sys.stdout))
+        for text, switchlist in digest:
+            # One message per alert type, split if the list of switches gets too long
+            prefix = text.rstrip()
+            message = prefix
+            for switch in switchlist:
+                if len(message) + len(switch) + 1 > SYSLOG_MAX and message != prefix:
+                    self.logger.critical(message)
+                    message = prefix
+                message += " " + switch
+            self.logger.critical(message)
+        return True
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+'''
+
+   Adaptive polling scheduler for compliancecheck.py.
+
+   Every switch has its own next check time.  Switches that changed status or are failing are
+   checked again after a short interval, switches that stay healthy back off up to a maximum
+   interval.  New switches are spread evenly over the base interval so the checks do not all
+   land at the same time.
+
+'''
+
+import heapq
+import random
+import time
+
+
+class PollScheduler(object):
+    """
+    Keep track of when each switch is due to be checked
+
+    Variables:
+    self.interval - base interval in seconds, also how often the device list is refreshed from CVP
+    self.fastinterval - interval in seconds for switches which changed status or are failing
+    self.maxinterval - longest interval in seconds a healthy switch backs off to
+    self.devices - dictionary of devices as kv pair mac_address: device
+    self.intervals - dictionary of the current interval of each switch as kv pair mac_address: seconds
+    self.nextcheck - dictionary of the next check time of each switch as kv pair mac_address: time
+    self.failures - dictionary of the consecutive failed checks of each switch as kv pair mac_address: count
+    self.refreshed - time the device list was last refreshed
+
+    Functions:
+    needsrefresh - returns whether the device list should be pulled from CVP again
+    sync - updates the scheduled switches to a new device list
+    due - returns the devices due for a check
+    reschedule - sets the next check time of a switch after it was checked
+    retry - sets the next check time of a switch whose check failed or was aborted
+    nextdue - returns the time the scheduler needs to run next
+    """
+
+    def __init__(self, interval, fastinterval, maxinterval):
+        self.interval = interval
+        self.fastinterval = fastinterval
+        self.maxinterval = maxinterval
+        self.devices = {}
+        self.intervals = {}
+        self.nextcheck = {}
+        self.failures = {}
+        self.refreshed = None
+        self._heap = []
+
+    def _schedule(self, mac, when):
+        self.nextcheck[mac] = when
+        heapq.heappush(self._heap, (when, mac))
+
+    def needsrefresh(self, now=None):
+        if now is None:
+            now = time.time()
+        return self.refreshed is None or now - self.refreshed >= self.interval
+
+    def sync(self, devices, now=None):
+        """
+        Function to update the scheduled switches, new switches are spread evenly over the base interval
+        and switches no longer in CVP are dropped.  Switches which were due but never rescheduled, because
+        their check failed, are scheduled again like new ones.
+
+        :param devices: dictionary of devices as kv pair mac_address: device
+        :param now: current time
+        """
+        if now is None:
+            now = time.time()
+        for mac in self.devices.keys():
+            if mac not in devices:
+                del self.intervals[mac]
+                self.nextcheck.pop(mac, None)
+                self.failures.pop(mac, None)
+        self.devices = dict(devices)
+        new = sorted(mac for mac in devices if mac not in self.nextcheck)
+        for i, mac in enumerate(new):
+            self.intervals.setdefault(mac, self.interval)
+            self._schedule(mac, now + float(self.interval) * i / len(new))
+        self.refreshed = now
+
+    def due(self, now=None):
+        """
+        Function to get the switches due for a check, they are removed from the schedule until rescheduled
+
+        :param now: current time
+
+        :return:
+        devices - list of cvp device objects
+        """
+        if now is None:
+            now = time.time()
+        devices = []
+        while self._heap and self._heap[0][0] <= now:
+            when, mac = heapq.heappop(self._heap)
+            # Skip entries of dropped switches and entries superseded by a reschedule
+            if self.nextcheck.get(mac) != when:
+                continue
+            del self.nextcheck[mac]
+            devices.append(self.devices[mac])
+        return devices
+
+    def reschedule(self, mac, unstable, now=None):
+        """
+        Function to set the next check time of a switch
+
+        :param mac: mac address of the switch
+        :param unstable: True if the switch changed status or is failing, it is checked again after fastinterval,
+        otherwise its interval doubles up to maxinterval
+        :param now: time of the check
+        """
+        if now is None:
+            now = time.time()
+        if mac not in self.devices:
+            return
+        if unstable:
+            interval = self.fastinterval
+        else:
+            interval = min(self.intervals[mac] * 2, self.maxinterval)
+        self.intervals[mac] = interval
+        self.failures.pop(mac, None)
+        # A little jitter keeps switches checked together from staying in lockstep
+        self._schedule(mac, now + interval * random.uniform(0.9, 1.1))
+
+    def retry(self, mac, now=None):
+        """
+        Function to set the next check time of a switch whose check failed or was aborted, it is retried after
+        fastinterval, doubling with each consecutive failure up to the base interval
+
+        :param mac: mac address of the switch
+        :param now: time of the failed check
+        """
+        if now is None:
+            now = time.time()
+        if mac not in self.devices:
+            return
+        failures = self.failures.get(mac, 0)
+        self.failures[mac] = failures + 1
+        interval = min(self.fastinterval * 2 ** min(failures, 16), self.interval)
+        self._schedule(mac, now + interval * random.uniform(0.9, 1.1))
+
+    def nextdue(self):
+        """
+        Function to get the time the scheduler needs to run next, either a switch check or a device list refresh
+
+        :return:
+        time of the next switch check or device list refresh, whichever comes first
+        """
+        nextrun = self.refreshed + self.interval if self.refreshed is not None else time.time()
+        while self._heap and self.nextcheck.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if self._heap:
+            nextrun = min(nextrun, self._heap[0][0])
+        return nextrun
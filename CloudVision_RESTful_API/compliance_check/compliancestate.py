@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+'''
+
+   Persistent device status store for compliancecheck.py.
+
+   The current status of every switch is kept in a small sqlite database keyed by mac address,
+   together with a log of every status transition.  This lets the compliance checker alert only
+   on transitions, also across restarts, and makes it cheap to look back at the history of a
+   switch or find switches that keep flapping.
+
+   Run standalone to list the switches that changed status most often:
+   compliancestate.py <state file> [hours, default 24] [min transitions, default 3]
+
+'''
+
+import sqlite3
+import sys, time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS status (
+    mac TEXT PRIMARY KEY,
+    ip TEXT,
+    status INTEGER,
+    since REAL,
+    checked REAL
+);
+CREATE TABLE IF NOT EXISTS transitions (
+    mac TEXT,
+    ip TEXT,
+    previous INTEGER,
+    status INTEGER,
+    time REAL
+);
+CREATE INDEX IF NOT EXISTS transitions_mac_time ON transitions (mac, time);
+CREATE INDEX IF NOT EXISTS transitions_time ON transitions (time);
+'''
+
+
+class StateStore(object):
+    """
+    Store the last known status of each switch and the transitions between statuses
+
+    Variables:
+    self.path - path of the sqlite database file, created if it does not exist
+    self.db - sqlite connection, only use the store from the thread that created it
+
+    Functions:
+    record - store the status of a list of switches and return the ones that changed
+    status - returns the stored status information of a given switch
+    history - returns the status transitions of a given switch
+    flapping - returns the switches with the most transitions in a time window
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+    def record(self, switches, now=None):
+        """
+        Function to store the status of the switches, a transition is logged for every switch whose status
+        differs from the stored one, or which has not been seen before
+
+        :param switches: list of Switch objects, makestatus must have been called
+        :param now: time of the check, defaults to the current time
+
+        :return:
+        changed - list of (switch, previous status) tuples, previous status is None for new switches
+        """
+        if now is None:
+            now = time.time()
+        changed = []
+        with self.db:
+            for switch in switches:
+                row = self.db.execute('SELECT status FROM status WHERE mac = ?', (switch.macaddress,)).fetchone()
+                previous = row[0] if row is not None else None
+                if previous == switch.status:
+                    self.db.execute('UPDATE status SET ip = ?, checked = ? WHERE mac = ?',
+                                    (switch.ipaddress, now, switch.macaddress))
+                    continue
+                self.db.execute('INSERT OR REPLACE INTO status (mac, ip, status, since, checked) VALUES (?, ?, ?, ?, ?)',
+                                (switch.macaddress, switch.ipaddress, switch.status, now, now))
+                self.db.execute('INSERT INTO transitions (mac, ip, previous, status, time) VALUES (?, ?, ?, ?, ?)',
+                                (switch.macaddress, switch.ipaddress, previous, switch.status, now))
+                changed.append((switch, previous))
+        return changed
+
+    def status(self, mac):
+        """
+        Function to get the stored status of a switch
+
+        :param mac: mac address of the switch
+
+        :return:
+        (ip, status, since, checked) tuple, or None if the switch is unknown
+        """
+        return self.db.execute('SELECT ip, status, since, checked FROM status WHERE mac = ?', (mac,)).fetchone()
+
+    def history(self, mac, since=0):
+        """
+        Function to get the status transitions of a switch
+
+        :param mac: mac address of the switch
+        :param since: only return transitions after this time
+
+        :return:
+        list of (time, ip, previous status, status) tuples, oldest first
+        """
+        return self.db.execute('SELECT time, ip, previous, status FROM transitions WHERE mac = ? AND time >= ? '
+                               'ORDER BY time', (mac, since)).fetchall()
+
+    def flapping(self, since, mintransitions=3):
+        """
+        Function to find switches which changed status often
+
+        :param since: only count transitions after this time
+        :param mintransitions: minimum number of transitions for a switch to be reported
+
+        :return:
+        list of (mac, ip, transitions) tuples, most transitions first
+        """
+        return self.db.execute('SELECT mac, MAX(ip), COUNT(*) AS count FROM transitions WHERE time >= ? '
+                               'GROUP BY mac HAVING count >= ? ORDER BY count DESC',
+                               (since, mintransitions)).fetchall()
+
+    def close(self):
+        self.db.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print "usage:compliancestate.py <state file> [hours] [min transitions]"
+        sys.exit(2)
+    hours = float(sys.argv[2]) if len(sys.argv) > 2 else 24
+    mintransitions = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    store = StateStore(sys.argv[1])
+    for mac, ip, count in store.flapping(time.time() - hours * 3600, mintransitions):
+        print "%s %s changed status %s times in the last %s hours" % (mac, ip, count, hours)
+    store.close()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+'''
+
+   Local stand-in for the cvp module, for running the compliance tools without a CVP server.
+
+   FakeCvp implements the parts of cvp.Cvp used by compliancecheck.py and compliance_check.py:
+   authenticate, getDevices, getContainers, deviceComplianceCheck, containerComplianceCheck,
+   the configlet calls getConfiglets, getConfiglet, addConfiglet and updateConfiglet, and the
+   ipConnectivityTest.do request sent through cvpService.doRequest.  Every call has a
+   configurable latency and error rate, and the synthetic devices can be made unreachable or
+   out of compliance at a given rate.
+
+   Call install() before importing compliancecheck to register this module as cvp.  It also
+   registers stand-ins for requests_2_4_0 (the requests package) and the daemon module if they
+   are not installed.
+
+'''
+
+import imp
+import json
+import random
+import sys
+import threading
+import time
+
+# Compliance codes, as returned by CVP
+DEVICE_IN_COMPLIANCE = 0
+DEVICE_CONFIG_OUT_OF_SYNC = 1
+DEVICE_NOT_REACHABLE = 5
+
+# Error code CVP returns from ipConnectivityTest.do for an unreachable device
+IP_NOT_REACHABLE = 122605
+# Error code CVP returns for any request once the session expired
+UNAUTHORIZED_USER = 112498
+
+ROOT_CONTAINER = 'Tenant'
+
+
+class CvpError(Exception):
+    """
+    Error raised by the fake, like cvpServices.CvpError the message starts with the error code
+    """
+    def __init__(self, code, msg):
+        Exception.__init__(self, '%s: %s' % (code, msg))
+        self.errorCode = code
+
+
+class cvpServices(object):
+    """
+    Matches the cvp.cvpServices module path used to catch CvpError
+    """
+    CvpError = CvpError
+
+
+class Device(object):
+    def __init__(self, fqdn, ipAddress, macAddress, containerName):
+        self.fqdn = fqdn
+        self.ipAddress = ipAddress
+        self.macAddress = macAddress
+        self.containerName = containerName
+
+
+class Container(object):
+    def __init__(self, name, parentName):
+        self.name = name
+        self.parentName = parentName
+
+
+class Configlet(object):
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+
+
+class ComplianceEvent(object):
+    def __init__(self, device, complianceCode):
+        self.device = device
+        self.complianceCode = complianceCode
+
+
+class FakeCvpService(object):
+    """
+    Stand-in for cvp.Cvp.cvpService, answers the raw requests compliancecheck.py sends
+    """
+
+    def __init__(self, cvp):
+        self.cvp = cvp
+        self.url = 'https://fakecvp'
+        self.cookies = {'session_id': 'fake'}
+
+    def doRequest(self, method, url, data=None, cookies=None, timeout=None):
+        if not url.endswith('/web/provisioning/ipConnectivityTest.do'):
+            raise CvpError(404, 'Unsupported request %s' % url)
+        ip = json.loads(data)['ipAddress']
+        device = self.cvp.devicesByIp[ip]
+        if device.macAddress in self.cvp.unreachable:
+            # CVP waits for the ping to time out before answering, the caller may give up sooner
+            delay = self.cvp.unreachabledelay
+            if timeout is not None:
+                delay = min(delay, timeout)
+            self.cvp.call('ipConnectivityTest', delay)
+            raise CvpError(IP_NOT_REACHABLE, 'Device %s is not reachable' % ip)
+        self.cvp.call('ipConnectivityTest')
+        return {'data': 'success'}
+
+
+class FakeCvp(object):
+    """
+    Stand-in for cvp.Cvp serving a synthetic network
+
+    Variables:
+    self.latency - seconds each call takes
+    self.unreachabledelay - seconds an ipConnectivityTest of an unreachable device takes
+    self.errorrate - fraction of calls failing with a CvpError
+    self.expired - when set every call fails with UNAUTHORIZED_USER until authenticate is called
+    self.devices - list of synthetic devices
+    self.containers - list of containers, ROOT_CONTAINER with containersize devices per child container
+    self.unreachable - set of mac addresses of unreachable devices
+    self.noncompliant - set of mac addresses of devices out of compliance
+    self.calls - dictionary of the number of calls made as kv pair call: count
+    """
+
+    def __init__(self, host='fakecvp', devices=100, containersize=50, latency=0.0, unreachabledelay=None,
+                 errorrate=0.0, unreachablerate=0.0, noncompliantrate=0.0, seed=None):
+        self.host = host
+        self.latency = latency
+        self.unreachabledelay = latency if unreachabledelay is None else unreachabledelay
+        self.errorrate = errorrate
+        self.expired = False
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.cvpService = FakeCvpService(self)
+
+        self.containers = [Container(ROOT_CONTAINER, None)]
+        self.devices = []
+        for i in range(devices):
+            if i % containersize == 0:
+                self.containers.append(Container('container%d' % (i / containersize), ROOT_CONTAINER))
+            self.devices.append(Device('switch%d.fake' % i, '10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255),
+                                       '00:1c:73:%02x:%02x:%02x' % (i >> 16 & 255, i >> 8 & 255, i & 255),
+                                       self.containers[-1].name))
+        self.devicesByIp = dict((device.ipAddress, device) for device in self.devices)
+        self.unreachable = set(device.macAddress for device in self.devices if self.random.random() < unreachablerate)
+        self.noncompliant = set(device.macAddress for device in self.devices
+                                if self.random.random() < noncompliantrate)
+        self.configlets = {}
+
+    def call(self, name, latency=None):
+        """
+        Function to account for a call, sleeps for its latency and injects errors at errorrate
+        """
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            fail = self.random.random() < self.errorrate
+        time.sleep(self.latency if latency is None else latency)
+        if self.expired and name != 'authenticate':
+            raise CvpError(UNAUTHORIZED_USER, 'Unauthorized User')
+        if fail:
+            raise CvpError(500, 'Injected error in %s' % name)
+
+    def complianceCode(self, device):
+        if device.macAddress in self.unreachable:
+            return DEVICE_NOT_REACHABLE
+        if device.macAddress in self.noncompliant:
+            return DEVICE_CONFIG_OUT_OF_SYNC
+        return DEVICE_IN_COMPLIANCE
+
+    def authenticate(self, username, password):
+        self.call('authenticate')
+        self.expired = False
+
+    def getDevices(self):
+        self.call('getDevices')
+        return list(self.devices)
+
+    def getContainers(self):
+        self.call('getContainers')
+        return list(self.containers)
+
+    def deviceComplianceCheck(self, device):
+        self.call('deviceComplianceCheck')
+        return self.complianceCode(device)
+
+    def containerComplianceCheck(self, container):
+        self.call('containerComplianceCheck')
+        names = set([container.name])
+        added = True
+        while added:
+            added = False
+            for child in self.containers:
+                if child.parentName in names and child.name not in names:
+                    names.add(child.name)
+                    added = True
+        return [ComplianceEvent(device, self.complianceCode(device)) for device in self.devices
+                if device.containerName in names]
+
+    def getConfiglets(self):
+        self.call('getConfiglets')
+        return self.configlets.values()
+
+    def getConfiglet(self, name):
+        self.call('getConfiglet')
+        if name not in self.configlets:
+            raise CvpError(132801, 'Configlet %s not found' % name)
+        return self.configlets[name]
+
+    def addConfiglet(self, configlet):
+        self.call('addConfiglet')
+        if configlet.name in self.configlets:
+            raise CvpError(132518, 'Configlet %s already exists' % configlet.name)
+        self.configlets[configlet.name] = configlet
+
+    def updateConfiglet(self, configlet):
+        self.call('updateConfiglet')
+        if configlet.name not in self.configlets:
+            raise CvpError(132801, 'Configlet %s not found' % configlet.name)
+        self.configlets[configlet.name] = configlet
+
+
+# cvp.Cvp
+Cvp = FakeCvp
+
+
+def install():
+    """
+    Function to register this module as cvp, and stand-ins for the requests_2_4_0 and daemon modules
+    if they are not installed
+    """
+    sys.modules['cvp'] = sys.modules[__name__]
+    try:
+        import requests_2_4_0
+    except ImportError:
+        import requests
+        sys.modules['requests_2_4_0'] = requests
+    try:
+        import daemon
+    except ImportError:
+        daemon = imp.new_module('daemon')
+
+        class Daemon(object):
+            def __init__(self, pidfile):
+                self.pidfile = pidfile
+
+        daemon.Daemon = Daemon
+        sys.modules['daemon'] = daemon
@@ -1,45 +1,60 @@
+import BaseHTTPServer
 from cvprac.cvp_client import CvpClient
 import git
+import hashlib
+import json
 import os
+import Queue
+import threading
 import time
 import shutil
+import sys
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 DEBUG = 0
 
-# syncFrom can be either cvp or git:
+# syncFrom can be either cvp, git or both:
 #  cvp - configlets are sync'd from cvp to the repo over commiting what's in the repo (CVP is the source of truth)
 #  git - configlets are sync'd from git to cvp overwritting what is in CVP (git is the source of truth)
+#  both - configlets changed in git are sync'd to CVP and configlets changed in CVP are committed to the repo,
+#         configlets changed on both sides since the last sync are reported as conflicts and left alone
 syncFrom = "git"
 
+# diffSync - when syncing from git, fetch all configlets from CVP once, compare them with the repo locally
+# and only push the configlets that were added or changed. Set to False to look up each configlet in CVP one by one
+diffSync = True
+# Number of configlets pushed to CVP in parallel when diffSync is enabled
+uploadWorkers = 8
+# Number of configlets fetched from CVP per request
+configletPageSize = 100
+
 # Path for git workspace (include trailing /)
 gitTempPath = '/tmp/GitConfiglets/'
 gitRepo = 'https://github.com/terensapp/cvpbackup'
 gitBranch = 'master'
 # Relative path within the repo to the configlet directory, leave blank if they reside in the root
 configletPath = ''
+# The working copy in gitTempPath is kept between runs and updated with a fetch, the commit of the last sync
+# is kept in this file inside it so only configlets changed since then are read and pushed. With syncFrom both
+# it also holds the hash and CVP date of each configlet at its last sync, and the configlets in conflict
+syncStateFile = gitTempPath + '.git/configletsync.json'
 ignoreConfiglets = ['.git','.md']
 # cvpNodes can be a single item or a list of the cluster
 cvpNodes = ['54.193.119.19']
 cvpUsername = 'arista'
 cvpPassword = 'arista'
 
-
-# Initialize the client
-cvpClient = CvpClient()
-
-# Attempt to connect to CVP, if it's not available wait 60 seconds
-attempts = 0
-while 1:
-   try: 
-      cvpClient.connect(cvpNodes, cvpUsername, cvpPassword)
-      if cvpClient.api.get_cvp_info()['version']:
-         break
-   except:
-      attempts += 1
-      print "Cannot connect to CVP waiting 1 minute attempt",attempts
-      time.sleep(60)
+# watch - keep running and sync again whenever the branch moves instead of syncing once and exiting.
+# The branch is checked with a git ls-remote every watchInterval seconds, with syncFrom cvp or both a sync
+# runs every watchInterval seconds as CVP has no cheap way to tell if configlets changed
+watch = False
+watchInterval = 60
+# Port for a webhook listener, a POST to it triggers a sync straight away. Set to None to disable
+webhookPort = None
+# Address the webhook listener binds to. The listener has no authentication, only bind it to an address
+# the git server can reach and nothing else can, '' listens on all interfaces
+webhookAddress = '127.0.0.1'
 
 
 # Function to sync configlet to CVP
@@ -49,8 +64,6 @@ def syncConfiglet(cvpClient,configletName,configletConfig):
       configlet = cvpClient.api.get_configlet_by_name(configletName)
       configletKey = configlet['key']
       configletCurrentConfig = configlet['config']
-      # For future use to compare date in CVP vs. Git (use this to push to Git)
-      configletCurrentDate = configlet['dateTimeInLongFormat']
       # If it does, check to see if the config is in sync, if not update the config with the one in Git
       if configletConfig == configletCurrentConfig:
         if DEBUG > 4:
@@ -67,53 +80,424 @@ def syncConfiglet(cvpClient,configletName,configletConfig):
 
 ##### End of syncConfiglet
 
+def configletHash(configletConfig):
+  # Hash of the configlet text, used to compare configlets without keeping both copies around
+  if isinstance(configletConfig, unicode):
+    configletConfig = configletConfig.encode('utf-8')
+  return hashlib.sha1(configletConfig).hexdigest()
+#### End of configletHash
+
+def iterConfiglets(cvpClient):
+  # Fetch the configlets from CVP a page at a time, so only one page is held in memory
+  start = 0
+  while True:
+    page = cvpClient.api.get_configlets(start, start + configletPageSize)
+    for configlet in page['data']:
+      yield configlet
+    start += configletPageSize
+    if not page['data'] or start >= page['total']:
+      return
+#### End of iterConfiglets
+
+def getCvpConfiglets(cvpClient):
+  # Fetch every configlet from CVP, keyed by configlet name
+  configlets = {}
+  for configlet in iterConfiglets(cvpClient):
+    configlets[configlet['name']] = configlet
+  return configlets
+#### End of getCvpConfiglets
+
+def connectWorker():
+  # A CVP session of its own for an upload worker. cvprac switches the session and node of a client when it
+  # logs in again or fails over to another node, so a client is never shared between threads
+  cvpClient = CvpClient()
+  cvpClient.connect(cvpNodes, cvpUsername, cvpPassword)
+  return cvpClient
+#### End of connectWorker
+
+def uploadConfiglets(cvpClient,changes):
+  # Push added or changed configlets to CVP, up to uploadWorkers at a time. The first worker uses cvpClient,
+  # the others connect their own client.
+  # changes is a list of (configletName, configletConfig, configletKey), configletKey is None for new configlets
+  pending = Queue.Queue()
+  for change in changes:
+    pending.put(change)
+  errors = []
+
+  def worker(workerClient):
+    if workerClient is None:
+      try:
+        workerClient = connectWorker()
+      except Exception as e:
+        # The other workers take over the configlets, the first one always runs with cvpClient
+        print "An upload worker could not connect to CVP", e
+        return
+    while True:
+      try:
+        configletName, configletConfig, configletKey = pending.get_nowait()
+      except Queue.Empty:
+        return
+      try:
+        if configletKey is None:
+          workerClient.api.add_configlet(configletName,configletConfig)
+          if DEBUG > 4:
+            print "Configlet", configletName, "has been added"
+        else:
+          workerClient.api.update_configlet(configletConfig,configletKey,configletName)
+          if DEBUG > 4:
+            print "Configlet", configletName, "exists and is now up to date"
+      except Exception as e:
+        errors.append((configletName, e))
+
+  workers = [threading.Thread(target=worker, args=(cvpClient if i == 0 else None,))
+             for i in range(min(uploadWorkers, len(changes)))]
+  for thread in workers:
+    thread.start()
+  for thread in workers:
+    thread.join()
+  for configletName, e in errors:
+    print "There was a problem syncing configlet", configletName, e
+  return [configletName for configletName, e in errors]
+#### End of uploadConfiglets
+
 def cloneRepo():
-  # Download/Update the repo
+  # Download the repo, only the latest commit is needed to start from
   try:
      if os.path.isdir(gitTempPath):
         shutil.rmtree(gitTempPath)
-     repo = git.Repo.clone_from(gitRepo,gitTempPath,branch=gitBranch)
+     return git.Repo.clone_from(gitRepo,gitTempPath,branch=gitBranch,depth=1)
   except:
      print "There was a problem downloading the files from the repo"
 #### End of cloneRepo
 
-def syncFromGit(cvpClient):
-  cloneRepo()
+def updateRepo():
+  # Update the persistent working copy with a fetch and fast-forward, clone it if it does not exist yet
+  if not os.path.isdir(gitTempPath + '.git'):
+     return cloneRepo()
+  try:
+     repo = git.Repo(gitTempPath)
+     repo.remotes.origin.fetch('+refs/heads/%s:refs/remotes/origin/%s' % (gitBranch, gitBranch))
+     try:
+        repo.git.merge('--ff-only', 'origin/' + gitBranch)
+     except git.GitCommandError:
+        # History was rewritten upstream, take the remote branch as it is
+        repo.git.reset('--hard', 'origin/' + gitBranch)
+     return repo
+  except (git.GitCommandError, git.InvalidGitRepositoryError):
+     print "There was a problem updating the working copy, cloning the repo again"
+     return cloneRepo()
+#### End of updateRepo
+
+def loadSyncState():
+  try:
+     with open(syncStateFile, 'r') as stateData:
+        return json.load(stateData)
+  except (IOError, ValueError):
+     return {}
+#### End of loadSyncState
+
+def saveSyncState(state):
+  with open(syncStateFile + '.tmp', 'w') as stateData:
+     json.dump(state, stateData)
+  os.rename(syncStateFile + '.tmp', syncStateFile)
+#### End of saveSyncState
+
+def isConfiglet(configletName):
+  return configletName not in ignoreConfiglets and not configletName.endswith(tuple(ignoreConfiglets))
+#### End of isConfiglet
 
+def listConfiglets(repo, lastCommit=None):
+  # List the configlets changed since lastCommit, or every configlet if there is no usable last commit
+  if lastCommit is not None:
+     try:
+        changed = repo.git.diff('--name-only', '--diff-filter=ACMRT', lastCommit, 'HEAD', '--',
+                                configletPath or '.')
+        configlets = []
+        for path in changed.splitlines():
+           directory, configletName = os.path.split(path)
+           # Only configlets directly in configletPath, the same files a full listing finds
+           if directory + '/' == configletPath or (directory == '' and configletPath == ''):
+              if isConfiglet(configletName):
+                 configlets.append(configletName)
+        return configlets
+     except git.GitCommandError:
+        print "Last synced commit", lastCommit, "not found, syncing all configlets"
   configlets = os.listdir(gitTempPath + configletPath)
+  return [configletName for configletName in configlets
+          if isConfiglet(configletName) and os.path.isfile(gitTempPath + configletPath + configletName)]
+#### End of listConfiglets
 
-  for configletName in configlets:
-     if configletName not in ignoreConfiglets and not configletName.endswith(tuple(ignoreConfiglets)):
-        with open(gitTempPath + configletPath + configletName, 'r') as configletData:
-           configletConfig=configletData.read()
-        syncConfiglet(cvpClient,configletName,configletConfig)
+def readConfiglet(configletName):
+  with open(gitTempPath + configletPath + configletName, 'r') as configletData:
+     return configletData.read()
+#### End of readConfiglet
 
-  if os.path.isdir(gitTempPath):
-     shutil.rmtree(gitTempPath)
+def syncFromGit(cvpClient):
+  # Returns True if every changed configlet was pushed to CVP
+  repo = updateRepo()
+  if repo is None:
+     return False
+  state = loadSyncState()
+
+  # Only the configlets touched since the last synced commit need to be read and pushed
+  configlets = listConfiglets(repo, state.get('commit'))
+
+  failed = []
+  if diffSync and configlets:
+     # Compare the repo with CVP locally and only push what differs
+     cvpConfiglets = getCvpConfiglets(cvpClient)
+     changes = []
+     for configletName in configlets:
+        configletConfig = readConfiglet(configletName)
+        if configletName not in cvpConfiglets:
+           changes.append((configletName, configletConfig, None))
+        elif configletHash(configletConfig) != configletHash(cvpConfiglets[configletName]['config']):
+           changes.append((configletName, configletConfig, cvpConfiglets[configletName]['key']))
+        elif DEBUG > 4:
+           print "Configlet", configletName, "exists and is up to date!"
+     failed = uploadConfiglets(cvpClient,changes)
+  elif not diffSync:
+     for configletName in configlets:
+        syncConfiglet(cvpClient,configletName,readConfiglet(configletName))
+
+  # Keep the previous commit if anything failed, so the same changes are retried next time
+  if failed:
+     return False
+  state['commit'] = repo.head.commit.hexsha
+  saveSyncState(state)
+  return True
 #### End of SyncFromGit
 
 def syncFromCVP(cvpClient):
-  cloneRepo()
-  repo = git.Repo(gitTempPath)
+  # Returns True once the repo holds the configlets in CVP
+  repo = updateRepo()
+  if repo is None:
+     return False
 
-  for configlet in cvpClient.api.get_configlets()['data']:
-    file = open(gitTempPath + configlet['name'],"w")
-    file.write(configlet['config'])
-    file.close()
-    repo.index.add([configlet['name']])
+  # Only write the configlets whose config differs from the file in the repo
+  changed = []
+  for configlet in iterConfiglets(cvpClient):
+    if not isConfiglet(configlet['name']):
+      continue
+    if os.path.isfile(gitTempPath + configletPath + configlet['name']):
+      if configletHash(readConfiglet(configlet['name'])) == configletHash(configlet['config']):
+        continue
+    changed.append(writeConfiglet(configlet['name'], configlet['config']))
+    if DEBUG > 4:
+      print "Configlet", configlet['name'], "has been updated in the repo"
 
-  repo.git.add(update=True)
-  repo.index.commit("Syncing repo with CVP")
-  repo.git.push("origin")
+  if not changed:
+    print "Repo is already in sync with CVP"
+    return True
+  if not commitConfiglets(repo, changed):
+    return False
+
+  # The commit came from CVP, a later sync from git has nothing to push back
+  state = loadSyncState()
+  state['commit'] = repo.head.commit.hexsha
+  saveSyncState(state)
+  return True
 #### End of syncFromCVP
 
-if syncFrom == 'cvp':
-  print "Syncing configlets from CVP to git repo"
-  syncFromCVP(cvpClient)
-  print "Completed successfully"
-elif syncFrom == 'git':
-  print "Syncing configlets from git repo to CVP"
-  syncFromGit(cvpClient)
-  print "Completed successfully"
-else:
-  print "Invalid sync option"
+def writeConfiglet(configletName, configletConfig):
+  # Write a configlet into the working copy, returns its path relative to the repo
+  with open(gitTempPath + configletPath + configletName, 'w') as configletData:
+    if isinstance(configletConfig, unicode):
+      configletConfig = configletConfig.encode('utf-8')
+    configletData.write(configletConfig)
+  return configletPath + configletName
+#### End of writeConfiglet
+
+def commitConfiglets(repo, paths):
+  # Stage the written configlets in one index update, commit and push. Returns True if the commit was pushed
+  repo.index.add(paths)
+  repo.index.commit("Syncing repo with CVP")
+  try:
+     repo.git.push("origin", "HEAD:" + gitBranch)
+  except git.GitCommandError as e:
+     print "There was a problem pushing to the repo", e
+     # Drop the local commit, the next sync writes the configlets and pushes them again
+     repo.git.reset('--hard', 'HEAD~1')
+     return False
+  return True
+#### End of commitConfiglets
+
+def syncBoth(cvpClient):
+  # Push configlets changed in git to CVP and configlets changed in CVP to git. The hash and CVP date of every
+  # configlet at its last sync are kept in the state file, a configlet changed on both sides since then is a
+  # conflict and is left alone on both sides until they hold the same config again. Returns True if every
+  # change was synced, conflicts do not count as failures as they wait for a fix by hand
+  repo = updateRepo()
+  if repo is None:
+     return False
+  state = loadSyncState()
+  synced = state.get('configlets', {})
+  conflicts = set(state.get('conflicts', []))
+
+  # Changed in git: touched since the last synced commit
+  gitChanged = set(listConfiglets(repo, state.get('commit')))
+  # Changed in CVP: never synced, or saved since the last sync with a different config
+  cvpConfiglets = getCvpConfiglets(cvpClient)
+  cvpChanged = set()
+  for configletName, configlet in cvpConfiglets.items():
+     if not isConfiglet(configletName):
+        continue
+     last = synced.get(configletName)
+     if last is None or (configlet['dateTimeInLongFormat'] > last['date'] and
+                         configletHash(configlet['config']) != last['hash']):
+        cvpChanged.add(configletName)
+
+  toCvp = []
+  toGit = []
+  for configletName in sorted(gitChanged | cvpChanged | conflicts):
+     gitHash = None
+     if os.path.isfile(gitTempPath + configletPath + configletName):
+        configletConfig = readConfiglet(configletName)
+        gitHash = configletHash(configletConfig)
+     cvpHash = None
+     configlet = cvpConfiglets.get(configletName)
+     if configlet is not None:
+        cvpHash = configletHash(configlet['config'])
+     last = synced.get(configletName, {})
+
+     if gitHash == cvpHash:
+        # Already the same on both sides, or a conflict resolved by hand
+        if gitHash is not None:
+           synced[configletName] = {'hash': gitHash, 'date': configlet['dateTimeInLongFormat']}
+        conflicts.discard(configletName)
+     elif (gitHash is None or cvpHash is None) and last:
+        # Deleted on one side, deletions are not synced
+        print "Configlet", configletName, "was deleted in", "git" if gitHash is None else "CVP", "and is not synced"
+     elif configletName in conflicts:
+        continue
+     elif configletName in gitChanged and (configletName not in cvpChanged or cvpHash is None):
+        toCvp.append((configletName, configletConfig, configlet['key'] if configlet is not None else None))
+     elif configletName in cvpChanged and (configletName not in gitChanged or gitHash is None):
+        toGit.append((configletName, configlet['config']))
+     else:
+        conflicts.add(configletName)
+
+  failed = uploadConfiglets(cvpClient, toCvp)
+  for configletName, configletConfig, configletKey in toCvp:
+     if configletName not in failed:
+        # The date CVP gives the update is newer than this one, the matching hash keeps it from looking changed
+        date = cvpConfiglets[configletName]['dateTimeInLongFormat'] if configletKey is not None else 0
+        synced[configletName] = {'hash': configletHash(configletConfig), 'date': date}
+  if toGit:
+     if commitConfiglets(repo, [writeConfiglet(configletName, configletConfig)
+                                for configletName, configletConfig in toGit]):
+        for configletName, configletConfig in toGit:
+           synced[configletName] = {'hash': configletHash(configletConfig),
+                                    'date': cvpConfiglets[configletName]['dateTimeInLongFormat']}
+     else:
+        failed.extend(configletName for configletName, configletConfig in toGit)
+
+  for configletName in sorted(conflicts):
+     print "Configlet", configletName, "was changed in both git and CVP, resolve the conflict by hand"
+
+  state['configlets'] = synced
+  state['conflicts'] = sorted(conflicts)
+  # Keep the previous commit if anything failed, so the same changes are retried next time
+  if not failed:
+     state['commit'] = repo.head.commit.hexsha
+  saveSyncState(state)
+  return not failed
+#### End of syncBoth
+
+def connectCvp():
+  # Attempt to connect to CVP, if it's not available wait 60 seconds
+  cvpClient = CvpClient()
+  attempts = 0
+  while 1:
+     try:
+        cvpClient.connect(cvpNodes, cvpUsername, cvpPassword)
+        if cvpClient.api.get_cvp_info()['version']:
+           return cvpClient
+     except:
+        attempts += 1
+        print "Cannot connect to CVP waiting 1 minute attempt",attempts
+        time.sleep(60)
+#### End of connectCvp
+
+def syncOnce(cvpClient):
+  # Returns True if the sync completed, False if some changes have to be retried
+  if syncFrom == 'cvp':
+    print "Syncing configlets from CVP to git repo"
+    synced = syncFromCVP(cvpClient)
+  elif syncFrom == 'git':
+    print "Syncing configlets from git repo to CVP"
+    synced = syncFromGit(cvpClient)
+  elif syncFrom == 'both':
+    print "Syncing configlets between git repo and CVP"
+    synced = syncBoth(cvpClient)
+  else:
+    print "Invalid sync option"
+    return False
+  if synced:
+    print "Completed successfully"
+  else:
+    print "Sync did not complete, the remaining changes will be retried"
+  return synced
+#### End of syncOnce
+
+def remoteHead():
+  # Commit the branch points to on the remote, without fetching anything
+  try:
+     refs = git.cmd.Git().ls_remote(gitRepo, 'refs/heads/' + gitBranch)
+  except git.GitCommandError:
+     print "There was a problem checking the repo for changes"
+     return None
+  return refs.split()[0] if refs else None
+#### End of remoteHead
+
+def startWebhook(trigger):
+  # Listen for webhook POSTs from the git server in a background thread, each one sets trigger
+  class WebhookHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_POST(self):
+      self.rfile.read(int(self.headers.getheader('Content-Length') or 0))
+      trigger.set()
+      self.send_response(204)
+      self.end_headers()
+
+    def log_message(self, format, *args):
+      if DEBUG > 4:
+        BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+  server = BaseHTTPServer.HTTPServer((webhookAddress, webhookPort), WebhookHandler)
+  thread = threading.Thread(target=server.serve_forever)
+  thread.daemon = True
+  thread.start()
+  return server
+#### End of startWebhook
+
+def watchRepo(cvpClient):
+  # Sync whenever the branch moves or the webhook fires, the CVP session is kept and only
+  # re-established after a sync failed
+  trigger = threading.Event()
+  if webhookPort is not None:
+     startWebhook(trigger)
+  lastHead = None
+  while True:
+     head = remoteHead()
+     if trigger.is_set() or syncFrom != 'git' or (head is not None and head != lastHead):
+        trigger.clear()
+        try:
+           # Only move on once everything up to head is synced, otherwise the next pass retries
+           if syncOnce(cvpClient):
+              lastHead = head
+        except Exception as e:
+           print "Sync failed, reconnecting to CVP:", e
+           cvpClient = connectCvp()
+     trigger.wait(watchInterval)
+#### End of watchRepo
+
+def main():
+  cvpClient = connectCvp()
+  if watch:
+     watchRepo(cvpClient)
+  elif not syncOnce(cvpClient):
+     sys.exit(1)
+#### End of main
+
+if __name__ == '__main__':
+  main()